@@ -5,40 +5,136 @@ Image transformation interface with multi-platform AI integration.
 
 import streamlit as st
 from PIL import Image
+import numpy as np
 import io
 import time  # for processing time
+import importlib  # for handler loading
+import threading  # for background handler preloading
 from datetime import datetime  # for timestamp
-import random  # for seed generation
+from concurrent.futures import ThreadPoolExecutor, as_completed  # for parallel variations
 
 from config.settings import (
     MIN_STRENGTH, MAX_STRENGTH, DEFAULT_STRENGTH,
     MAX_FILE_SIZE_MB, ALLOWED_EXTENSIONS
 )
-from config.style_presets import ALL_STYLES
-from utils.image_loader import validate_image, load_and_preprocess, resize_image, image_to_bytes
-from utils.image_processor import create_side_by_side, get_image_info
+from config.style_presets import ALL_CATEGORIES, STYLE_KEYS, FLAT_STYLES
+from utils.image_loader import validate_image_bytes, load_and_preprocess, resize_image, image_to_bytes
+from utils.image_processor import create_side_by_side, get_image_info, create_thumbnail_bytes
 from utils.comparison_ui import (
     display_before_after, create_download_button,
     display_image_info, show_transformation_settings,
     display_slider_comparison, display_image_grid
 )
 
-
-def load_css():
-    """Loads custom CSS file."""
+# Seed generator for variations (PCG64, whole batch in one call)
+_RNG = np.random.default_rng()
+
+# Sidebar platform label -> short description (display order)
+PLATFORM_OPTIONS = {
+    "💻 Local GPU": "RTX 3060 • FREE • Unlimited • Fastest",
+    "🎨 Leonardo.ai": "Phoenix Model",
+    "🤖 DeepAI": "Image Editor ",
+    "🤗 Hugging Face": "SDXL Refiner",
+    "🔮 Replicate": "Cloud GPU",
+    "⚡ Stability AI": "SDXL 1.0"
+}
+
+# Sidebar platform label -> handler key
+PLATFORM_MAP = {
+    "💻 Local GPU": "local",
+    "🎨 Leonardo.ai": "leonardo",
+    "🤖 DeepAI": "deepai",
+    "🤗 Hugging Face": "hf",
+    "🔮 Replicate": "replicate",
+    "⚡ Stability AI": "stability"
+}
+
+# Handler key -> (module path, display name)
+HANDLER_MODULES = {
+    "local": ("utils.local_inference_handler", "Local GPU"),
+    "leonardo": ("utils.leonardo_api_handler", "Leonardo.ai"),
+    "deepai": ("utils.deepai_api_handler", "DeepAI"),
+    "hf": ("utils.hf_api_handler", "Hugging Face"),
+    "replicate": ("utils.replicate_api_handler", "Replicate"),
+    "stability": ("utils.stability_ai_handler", "Stability AI")
+}
+
+
+# Platforms that send the upload as a base64 data URI - the smaller WebP pays off there.
+# The rest get the JPEG encoding.
+WEBP_UPLOAD_PLATFORMS = frozenset({"leonardo", "replicate"})
+
+
+@st.cache_resource(show_spinner=False)
+def get_handler(platform_key):
+    """Imports the platform handler once per process and returns (handler, platform name)."""
+
+    module_path, platform_name = HANDLER_MODULES[platform_key]
+    return importlib.import_module(module_path), platform_name
+
+
+@st.cache_data(show_spinner=False)
+def _load_css_text():
+    """Reads custom CSS file once per process."""
     try:
         with open("assets/style.css", "r", encoding="utf-8") as f:
-            st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
+            return f.read()
     except FileNotFoundError:
-        pass
+        return ""
+
+
+# SDK names the cloud handlers import inside their functions, as (module, attribute).
+# huggingface_hub loads submodules on attribute access, so the attribute is touched too.
+PRELOAD_LAZY_SDKS = [("huggingface_hub", "InferenceClient")]  # HF handler
+
+
+@st.cache_resource(show_spinner=False)
+def preload_handlers():
+    """
+    Imports cloud handler modules, and the SDKs they import lazily, in a
+    background thread (once per process), so the first Transform click doesn't
+    pay their import time.
+    Local GPU handler is skipped - torch/diffusers are only loaded when used.
+    """
+
+    targets = [(path, None) for key, (path, _) in HANDLER_MODULES.items() if key != "local"]
+    targets += PRELOAD_LAZY_SDKS
+
+    def _import_all():
+        for module_path, attribute in targets:
+            try:
+                module = importlib.import_module(module_path)
+                if attribute:
+                    getattr(module, attribute)
+            except Exception as e:  # missing SDK etc. - reported again on use
+                print(f"⚠️ Preload skipped for {module_path}: {e}")
+
+    thread = threading.Thread(target=_import_all, daemon=True)
+    thread.start()
+    return thread
+
+
+def load_css():
+    """Loads custom CSS file."""
+    css = _load_css_text()
+    if css:
+        st.markdown(f"<style>{css}</style>", unsafe_allow_html=True)
 
 
 def init_session_state():
     """Initialize session state."""
-    if "transformed_images" not in st.session_state:
-        st.session_state.transformed_images = []  # Changed to list
     if "original_image" not in st.session_state:
         st.session_state.original_image = None
+    if "original_image_bytes" not in st.session_state:
+        st.session_state.original_image_bytes = None  # API payload (lossy)
+    if "original_png_bytes" not in st.session_state:
+        st.session_state.original_png_bytes = None  # lossless copy for comparisons
+    if "original_upload" not in st.session_state:
+        st.session_state.original_upload = None  # raw uploaded file bytes
+    if "transformed_png_bytes" not in st.session_state:
+        st.session_state.transformed_png_bytes = []  # encoded downloads
+    if "transformed_thumbs" not in st.session_state:
+        st.session_state.transformed_thumbs = []  # grid previews
     if "transformation_done" not in st.session_state:
         st.session_state.transformation_done = False
     if "platform_settings" not in st.session_state:
@@ -53,6 +149,155 @@ def render_header():
     st.caption("Multi-Platform AI Support • Professional Image Variations")
 
 
+def _render_local_settings():
+    """Local GPU settings widgets."""
+
+    st.caption("**Local GPU Settings**")
+    steps = st.slider("Inference Steps:", 10, 50, 15, 5)
+    guidance = st.slider("Guidance Scale:", 5.0, 15.0, 7.5, 0.5)
+    scheduler = st.selectbox("Scheduler:", ["DPMSolverMultistep", "EulerDiscrete", "DDIM"])
+
+    return {
+        "steps": steps,
+        "guidance_scale": guidance,
+        "scheduler": scheduler
+    }
+
+
+def _render_leonardo_settings():
+    """Leonardo.ai settings widgets."""
+
+    st.caption("**Leonardo.ai Settings**")
+    model = st.selectbox("Model:", [
+        "Leonardo Phoenix (Best Quality)",
+        "Leonardo Diffusion XL"
+    ])
+    steps = st.slider("Inference Steps:", 20, 50, 30, 5)
+    guidance = st.slider("Guidance Scale:", 5.0, 10.0, 7.0, 0.5)
+
+    return {
+        "model": "phoenix" if "Phoenix" in model else "diffusion_xl",
+        "steps": steps,
+        "guidance_scale": guidance
+    }
+
+
+def _render_deepai_settings():
+    """DeepAI settings (no widgets)."""
+
+    st.caption("**DeepAI Settings**")
+    st.info("ℹ️ DeepAI uses automatic settings. Strength is controlled via prompt.")
+
+    return {}
+
+
+def _render_hf_settings():
+    """Hugging Face settings widgets."""
+
+    st.caption("**Hugging Face Settings**")
+    model = st.selectbox("Model:", [
+        "stabilityai/stable-diffusion-xl-refiner-1.0",
+        "stabilityai/stable-diffusion-2-1"
+    ])
+
+    return {"model": model}
+
+
+def _render_stability_settings():
+    """Stability AI settings widgets."""
+
+    st.caption("**Stability AI Settings**")
+    engine = st.selectbox("Engine:", ["stable-diffusion-xl-1024-v1-0"])
+    steps = st.slider("Steps:", 30, 50, 50, 5)
+    cfg = st.slider("CFG Scale:", 7.0, 15.0, 12.0, 0.5)
+
+    return {
+        "engine": engine,
+        "steps": steps,
+        "cfg_scale": cfg
+    }
+
+
+def _render_replicate_settings():
+    """Replicate settings widgets."""
+
+    st.caption("**Replicate Settings**")
+    version = st.text_input("Model Version:", "stability-ai/sdxl:...", disabled=True)
+
+    return {"version": version}
+
+
+# Sidebar platform label -> settings renderer (returns platform_settings dict)
+_PLATFORM_RENDERERS = {
+    "💻 Local GPU": _render_local_settings,
+    "🎨 Leonardo.ai": _render_leonardo_settings,
+    "🤖 DeepAI": _render_deepai_settings,
+    "🤗 Hugging Face": _render_hf_settings,
+    "🔮 Replicate": _render_replicate_settings,
+    "⚡ Stability AI": _render_stability_settings
+}
+
+
+# Widgets inside a st.fragment rerun only that fragment instead of the whole script.
+# A fragment rerun doesn't hand return values back to the main script, so the
+# sidebar fragments share their values through session state keys.
+
+@st.fragment
+def _render_strength_settings():
+    """Strength and variation count sliders (reruns on its own, values in session state)."""
+
+    strength = st.slider(
+        "Transformation Strength:",
+        MIN_STRENGTH, MAX_STRENGTH, DEFAULT_STRENGTH, 0.05,
+        key="strength",
+        help="Low=original, High=different"
+    )
+
+    # Strength info
+    if strength < 0.5:
+        st.info("💡 Minimal change")
+    elif strength < 0.7:
+        st.success("💡 Balanced (recommended)")
+    else:
+        st.warning("💡 Creative result")
+
+    # NEW: Variation count slider
+    st.markdown("---")
+    num_variations = st.slider(
+        "How many variations?",
+        min_value=1,
+        max_value=4,
+        value=1,
+        step=1,
+        key="num_variations",
+        help="Generate multiple variations from the same image with different seeds"
+    )
+
+    if num_variations > 1:
+        st.caption(f"💡 {num_variations} different variations will be generated")
+
+
+@st.fragment
+def _render_style_selection():
+    """Preset style pickers (reruns on its own, result kept in session state)."""
+
+    category = st.selectbox("Category:", ALL_CATEGORIES)
+    style_name = st.selectbox("Style:", STYLE_KEYS[category])
+    style_config = FLAT_STYLES[(category, style_name)]
+    st.session_state.style_config = style_config
+
+    with st.expander("📋 Style Details"):
+        st.caption(f"**Prompt:** {style_config['prompt'][:80]}...")
+        st.caption(f"**Recommended Strength:** {style_config['strength']}")
+
+
+@st.fragment
+def _render_platform_settings(platform):
+    """Platform-specific settings (reruns on its own, result kept in session state)."""
+
+    st.session_state.platform_settings = _PLATFORM_RENDERERS[platform]()
+
+
 def render_sidebar():
     """Left sidebar - collapsible sections."""
 
@@ -61,23 +306,14 @@ def render_sidebar():
     # === PLATFORM SELECTION (Expandable) ===
     with st.sidebar.expander("🚀 Platform Selection", expanded=True):
 
-        platform_options = {
-            "💻 Local GPU": "RTX 3060 • FREE • Unlimited • Fastest",
-            "🎨 Leonardo.ai": "Phoenix Model",
-            "🤖 DeepAI": "Image Editor ",
-            "🤗 Hugging Face": "SDXL Refiner",
-            "🔮 Replicate": "Cloud GPU",
-            "⚡ Stability AI": "SDXL 1.0"
-        }
-
         platform = st.selectbox(
             "AI Platform:",
-            options=list(platform_options.keys()),
-            format_func=lambda x: f"{x}\n{platform_options[x]}",
+            options=tuple(PLATFORM_OPTIONS),
+            format_func=lambda x: f"{x}\n{PLATFORM_OPTIONS[x]}",
             help="Select AI platform"
         )
 
-        st.caption(f"ℹ️ {platform_options[platform]}")
+        st.caption(f"ℹ️ {PLATFORM_OPTIONS[platform]}")
 
     st.sidebar.markdown("---")
 
@@ -92,33 +328,10 @@ def render_sidebar():
             label_visibility="collapsed"
         )
 
-        strength = st.slider(
-            "Transformation Strength:",
-            MIN_STRENGTH, MAX_STRENGTH, DEFAULT_STRENGTH, 0.05,
-            help="Low=original, High=different"
-        )
-
-        # Strength info
-        if strength < 0.5:
-            st.info("💡 Minimal change")
-        elif strength < 0.7:
-            st.success("💡 Balanced (recommended)")
-        else:
-            st.warning("💡 Creative result")
-
-        # NEW: Variation count slider
-        st.markdown("---")
-        num_variations = st.slider(
-            "How many variations?",
-            min_value=1,
-            max_value=4,
-            value=1,
-            step=1,
-            help="Generate multiple variations from the same image with different seeds"
-        )
+        _render_strength_settings()
 
-        if num_variations > 1:
-            st.caption(f"💡 {num_variations} different variations will be generated")
+    strength = st.session_state.strength
+    num_variations = st.session_state.num_variations
 
     st.sidebar.markdown("---")
 
@@ -129,13 +342,8 @@ def render_sidebar():
 
     if "Preset Style" in mode:
         with st.sidebar.expander("🎨 Style Selection", expanded=True):
-            category = st.selectbox("Category:", list(ALL_STYLES.keys()))
-            style_name = st.selectbox("Style:", list(ALL_STYLES[category].keys()))
-            style_config = ALL_STYLES[category][style_name]
-
-            with st.expander("📋 Style Details"):
-                st.caption(f"**Prompt:** {style_config['prompt'][:80]}...")
-                st.caption(f"**Recommended Strength:** {style_config['strength']}")
+            _render_style_selection()
+        style_config = st.session_state.style_config
     else:
         with st.sidebar.expander("✏️ Custom Prompt", expanded=True):
             custom_prompt = st.text_area(
@@ -152,70 +360,36 @@ def render_sidebar():
 
     # === PLATFORM-SPECIFIC SETTINGS (Collapsed) ===
     with st.sidebar.expander("🔧 Platform Settings", expanded=False):
-
-        if "Local" in platform:
-            st.caption("**Local GPU Settings**")
-            steps = st.slider("Inference Steps:", 20, 50, 30, 5)
-            guidance = st.slider("Guidance Scale:", 5.0, 15.0, 7.5, 0.5)
-            scheduler = st.selectbox("Scheduler:", ["DPMSolverMultistep", "EulerDiscrete", "DDIM"])
-
-            st.session_state.platform_settings = {
-                "steps": steps,
-                "guidance_scale": guidance,
-                "scheduler": scheduler
-            }
-
-        elif "Leonardo" in platform:
-            st.caption("**Leonardo.ai Settings**")
-            model = st.selectbox("Model:", [
-                "Leonardo Phoenix (Best Quality)",
-                "Leonardo Diffusion XL"
-            ])
-            steps = st.slider("Inference Steps:", 20, 50, 30, 5)
-            guidance = st.slider("Guidance Scale:", 5.0, 10.0, 7.0, 0.5)
-
-            st.session_state.platform_settings = {
-                "model": "phoenix" if "Phoenix" in model else "diffusion_xl",
-                "steps": steps,
-                "guidance_scale": guidance
-            }
-
-        elif "DeepAI" in platform:
-            st.caption("**DeepAI Settings**")
-            st.info("ℹ️ DeepAI uses automatic settings. Strength is controlled via prompt.")
-
-            st.session_state.platform_settings = {}
-
-        elif "Hugging Face" in platform:
-            st.caption("**Hugging Face Settings**")
-            model = st.selectbox("Model:", [
-                "stabilityai/stable-diffusion-xl-refiner-1.0",
-                "stabilityai/stable-diffusion-2-1"
-            ])
-
-            st.session_state.platform_settings = {"model": model}
-
-        elif "Stability AI" in platform:
-            st.caption("**Stability AI Settings**")
-            engine = st.selectbox("Engine:", ["stable-diffusion-xl-1024-v1-0"])
-            steps = st.slider("Steps:", 30, 50, 50, 5)
-            cfg = st.slider("CFG Scale:", 7.0, 15.0, 12.0, 0.5)
-
-            st.session_state.platform_settings = {
-                "engine": engine,
-                "steps": steps,
-                "cfg_scale": cfg
-            }
-
-        elif "Replicate" in platform:
-            st.caption("**Replicate Settings**")
-            version = st.text_input("Model Version:", "stability-ai/sdxl:...", disabled=True)
-
-            st.session_state.platform_settings = {"version": version}
+        _render_platform_settings(platform)
 
     return platform, mode, strength, style_config, custom_prompt, negative_prompt, num_variations
 
 
+@st.cache_data(max_entries=4, show_spinner=False)
+def _prepare_upload(file_bytes):
+    """
+    Decodes (incl. RGBA composite), resizes and encodes an upload once per
+    file content - reruns reuse the cached result. Validation only reads
+    name/size, so it needs no cache.
+    """
+
+    image = load_and_preprocess(io.BytesIO(file_bytes))  # single decode
+    image = resize_image(image)
+    return (
+        image,
+        image_to_bytes(image),  # API payload: JPEG - nvJPEG on local GPU, passed through as is by Stability
+        image_to_bytes(image, format="PNG")  # lossless original for the comparison views and downloads
+    )
+
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def _prepare_webp_upload(file_bytes):
+    """WebP encoding of an upload for the data-URI platforms, once per file content."""
+
+    image = _prepare_upload(file_bytes)[0]
+    return image_to_bytes(image, format="WEBP", quality=80)  # smallest base64 payload
+
+
 def render_main_content(platform):
     """Main content - single column, full width."""
 
@@ -228,15 +402,18 @@ def render_main_content(platform):
     )
 
     if uploaded_file:
-        is_valid, message = validate_image(uploaded_file)
+        raw = uploaded_file.getvalue()  # single read of the upload buffer
+        is_valid, message = validate_image_bytes(raw, uploaded_file.name)
 
         if not is_valid:
             st.error(f"❌ {message}")
             return None
 
-        image = load_and_preprocess(uploaded_file)
-        image = resize_image(image)
+        image, image_bytes, display_png = _prepare_upload(raw)
         st.session_state.original_image = image
+        st.session_state.original_image_bytes = image_bytes
+        st.session_state.original_png_bytes = display_png
+        st.session_state.original_upload = raw
 
         # Preview - centered
         col1, col2, col3 = st.columns([1, 2, 1])
@@ -248,6 +425,79 @@ def render_main_content(platform):
     return None
 
 
+def generate_variations(handler, num_variations, progress_bar, seeds, parallel=True, **transform_kwargs):
+    """
+    Calls handler.transform_image once per variation.
+
+    Each variation gets its own seed from seeds (a batch uses seeds[0] as base).
+    Handlers with SUPPORTS_BATCH generate all variations in a single request.
+    Other cloud platforms are I/O-bound, so variations are requested concurrently
+    and the first failure cancels the ones still waiting. Local GPU runs serially.
+
+    Returns:
+        tuple: (success status, list of images or error message)
+    """
+
+    if num_variations > 1 and getattr(handler, "SUPPORTS_BATCH", False):
+        progress_bar.progress(20, text=f"⚡ Generating {num_variations} variations in one batch...")
+
+        success, result = handler.transform_images(
+            num_outputs=num_variations, seed=seeds[0], **transform_kwargs
+        )
+
+        if not success:
+            return False, f"Batch generation failed: {result}"
+
+        return True, result
+
+    if not parallel or num_variations == 1:
+        generated_images = []
+
+        for i in range(num_variations):
+            # Update progress
+            progress_percent = 20 + int((i / num_variations) * 70)
+            progress_bar.progress(progress_percent, text=f"⚡ Generating variation {i + 1}/{num_variations}...")
+
+            success, result = handler.transform_image(seed=seeds[i], **transform_kwargs)
+
+            if not success:
+                return False, f"Variation {i + 1} failed: {result}"
+
+            generated_images.append(result)
+
+        return True, generated_images
+
+    generated_images = [None] * num_variations
+    progress_bar.progress(20, text=f"⚡ Generating {num_variations} variations in parallel...")
+
+    executor = ThreadPoolExecutor(max_workers=num_variations)
+    futures = {
+        executor.submit(handler.transform_image, seed=seeds[i], **transform_kwargs): i
+        for i in range(num_variations)
+    }
+
+    try:
+        for done, future in enumerate(as_completed(futures), start=1):
+            i = futures[future]
+            success, result = future.result()
+
+            if not success:
+                return False, f"Variation {i + 1} failed: {result}"
+
+            generated_images[i] = result
+
+            # Update progress
+            progress_percent = 20 + int((done / num_variations) * 70)
+            progress_bar.progress(progress_percent, text=f"⚡ {done}/{num_variations} variations ready...")
+    finally:
+        # Cancel other variations on error - don't wait for requests already in flight
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+    return True, generated_images
+
+
 def render_transform(image, platform, mode, strength, style_config, custom_prompt, negative_prompt, num_variations):
     """Transform button and processing."""
 
@@ -264,7 +514,7 @@ def render_transform(image, platform, mode, strength, style_config, custom_promp
             with progress_container:
                 progress_bar = st.progress(0, text="🔄 Starting...")
 
-                image_bytes = image_to_bytes(image)
+                image_bytes = st.session_state.original_image_bytes  # encoded once per upload
 
                 # Record processing time
                 start_time = time.time()
@@ -273,28 +523,15 @@ def render_transform(image, platform, mode, strength, style_config, custom_promp
                     # Platform import
                     progress_bar.progress(10, text=f"🔗 Connecting to {platform}...")
 
-                    if "Hugging Face" in platform:
-                        from utils import hf_api_handler as handler
-                        platform_name = "Hugging Face"
-                    elif "Leonardo" in platform:
-                        from utils import leonardo_api_handler as handler
-                        platform_name = "Leonardo.ai"
-                    elif "DeepAI" in platform:
-                        from utils import deepai_api_handler as handler
-                        platform_name = "DeepAI"
-                    elif "Replicate" in platform:
-                        from utils import replicate_api_handler as handler
-                        platform_name = "Replicate"
-                    elif "Stability AI" in platform:
-                        from utils import stability_ai_handler as handler
-                        platform_name = "Stability AI"
-                    elif "Local" in platform:
-                        from utils import local_inference_handler as handler
-                        platform_name = "Local GPU"
-                    else:
+                    if platform not in PLATFORM_MAP:
                         st.error("❌ Invalid platform")
                         return
 
+                    handler, platform_name = get_handler(PLATFORM_MAP[platform])
+
+                    if PLATFORM_MAP[platform] in WEBP_UPLOAD_PLATFORMS:
+                        image_bytes = _prepare_webp_upload(st.session_state.original_upload)
+
                     progress_bar.progress(20, text=f"🎨 Loading model...")
 
                     # Determine prompt and negative prompt
@@ -305,33 +542,25 @@ def render_transform(image, platform, mode, strength, style_config, custom_promp
                         used_prompt = custom_prompt
                         used_negative_prompt = negative_prompt
 
+                    # Random seed for each variation, generated in one call
+                    seeds = _RNG.integers(1, 2147483647, size=num_variations, dtype=np.int64).tolist()
+
                     # Multiple variation generation
-                    generated_images = []
-
-                    for i in range(num_variations):
-                        # Update progress
-                        progress_percent = 20 + int((i / num_variations) * 70)
-                        progress_text = f"⚡ Generating variation {i + 1}/{num_variations}..."
-                        progress_bar.progress(progress_percent, text=progress_text)
-
-                        # Random seed for each variation (some platforms don't support but no harm)
-                        seed = random.randint(1, 2147483647)
-
-                        # Transform operation
-                        success, result = handler.transform_image(
-                            image_bytes=image_bytes,
-                            prompt=used_prompt,
-                            strength=strength,
-                            negative_prompt=used_negative_prompt
-                        )
-
-                        if success:
-                            generated_images.append(result)
-                        else:
-                            # Cancel other variations on error
-                            progress_bar.empty()
-                            st.error(f"❌ Variation {i + 1} failed: {result}")
-                            return
+                    success, result = generate_variations(
+                        handler, num_variations, progress_bar, seeds,
+                        parallel=PLATFORM_MAP[platform] != "local",  # GPU-bound, keep serial
+                        image_bytes=image_bytes,
+                        prompt=used_prompt,
+                        strength=strength,
+                        negative_prompt=used_negative_prompt
+                    )
+
+                    if not success:
+                        progress_bar.empty()
+                        st.error(f"❌ {result}")
+                        return
+
+                    generated_images = result
 
                     # Processing time
                     duration = time.time() - start_time
@@ -339,7 +568,16 @@ def render_transform(image, platform, mode, strength, style_config, custom_promp
                     progress_bar.progress(100, text="✅ Completed!")
 
                     # Save to session state
-                    st.session_state.transformed_images = generated_images
+                    # Encode downloads once instead of on every rerun
+                    # (encoders release the GIL, so variations are encoded in parallel)
+                    with ThreadPoolExecutor(max_workers=max(1, min(len(generated_images), 8))) as pool:
+                        st.session_state.transformed_png_bytes = list(pool.map(
+                            lambda img: image_to_bytes(img, format="PNG"), generated_images
+                        ))
+                        # Small WebP previews for the multi-variation grid
+                        st.session_state.transformed_thumbs = list(pool.map(
+                            create_thumbnail_bytes, generated_images
+                        )) if num_variations > 1 else []
                     st.session_state.transformation_done = True
 
                     # Save metadata
@@ -360,10 +598,33 @@ def render_transform(image, platform, mode, strength, style_config, custom_promp
                     st.error(f"❌ Error: {str(e)}")
 
 
+@st.cache_data(show_spinner=False)
+def _cached_side_by_side(orig_bytes, trans_bytes):
+    """Builds the comparison composite once per image pair and returns it as PNG bytes."""
+
+    combined = create_side_by_side(
+        Image.open(io.BytesIO(orig_bytes)),
+        Image.open(io.BytesIO(trans_bytes))
+    )
+    return image_to_bytes(combined, format="PNG")
+
+
+def _grid(items, action, cols_per_row=2):
+    """Lays items out row by row, calling action(item) inside each column."""
+
+    items = list(items)
+    for i in range(0, len(items), cols_per_row):
+        row = items[i:i + cols_per_row]
+        for item, col in zip(row, st.columns(cols_per_row)):
+            with col:
+                action(item)
+
+
+@st.fragment
 def render_results():
     """Result tabs."""
 
-    if st.session_state.transformation_done and st.session_state.transformed_images:
+    if st.session_state.transformation_done and len(st.session_state.transformed_png_bytes) > 0:
         st.markdown("### 🖼️ Result")
 
         # Show metadata
@@ -377,22 +638,25 @@ def render_results():
             negative_prompt=metadata.get("negative_prompt")
         )
 
-        num_images = len(st.session_state.transformed_images)
+        num_images = len(st.session_state.transformed_png_bytes)
 
         # If single variation, show as before
         if num_images == 1:
             tab1, tab2, tab3 = st.tabs(["📊 Side by Side", "🔍 Comparison", "💾 Download"])
 
+            # PNG bytes encoded once at transform time, reused by every tab
+            transformed_png = st.session_state.transformed_png_bytes[0]
+
             with tab1:
                 display_before_after(
-                    st.session_state.original_image,
-                    st.session_state.transformed_images[0]
+                    st.session_state.original_png_bytes,
+                    transformed_png
                 )
 
             with tab2:
                 display_slider_comparison(
-                    st.session_state.original_image,
-                    st.session_state.transformed_images[0]
+                    st.session_state.original_png_bytes,
+                    transformed_png
                 )
 
             with tab3:
@@ -400,58 +664,34 @@ def render_results():
 
                 with col1:
                     st.markdown("**🎨 Transformed**")
-                    st.image(st.session_state.transformed_images[0], width="stretch")
-                    create_download_button(st.session_state.transformed_images[0], "transformed.png")
+                    st.image(transformed_png, width="stretch")
+                    create_download_button(transformed_png, "transformed.png")
 
                 with col2:
                     st.markdown("**📊 Comparison**")
-                    combined = create_side_by_side(
-                        st.session_state.original_image,
-                        st.session_state.transformed_images[0]
+                    combined_png = _cached_side_by_side(
+                        st.session_state.original_png_bytes,
+                        transformed_png
                     )
-                    st.image(combined, width="stretch")
-                    create_download_button(combined, "comparison.png")
+                    st.image(combined_png, width="stretch")
+                    create_download_button(combined_png, "comparison.png")
 
-        # If multiple variations, show grid
+        # If multiple variations, show grid (preview + download per cell)
         else:
-            tab1, tab2 = st.tabs(["🎨 All Variations", "💾 Download"])
+            st.markdown(f"**{num_images} different variations generated:**")
 
-            with tab1:
-                st.markdown(f"**{num_images} different variations generated:**")
-
-                # Grid layout (2 columns)
-                cols_per_row = 2
-                for i in range(0, num_images, cols_per_row):
-                    cols = st.columns(cols_per_row)
-                    for j in range(cols_per_row):
-                        idx = i + j
-                        if idx < num_images:
-                            with cols[j]:
-                                st.image(
-                                    st.session_state.transformed_images[idx],
-                                    caption=f"Variation {idx + 1}",
-                                    width="stretch"
-                                )
+            def show_variation(idx):
+                st.image(
+                    st.session_state.transformed_thumbs[idx],
+                    caption=f"Variation {idx + 1}",
+                    width="stretch"
+                )
+                create_download_button(
+                    st.session_state.transformed_png_bytes[idx],
+                    f"variation_{idx + 1}.png"
+                )
 
-            with tab2:
-                st.markdown("**Download each variation separately:**")
-
-                # Download button for each variation
-                cols_per_row = 2
-                for i in range(0, num_images, cols_per_row):
-                    cols = st.columns(cols_per_row)
-                    for j in range(cols_per_row):
-                        idx = i + j
-                        if idx < num_images:
-                            with cols[j]:
-                                st.image(
-                                    st.session_state.transformed_images[idx],
-                                    width="stretch"
-                                )
-                                create_download_button(
-                                    st.session_state.transformed_images[idx],
-                                    f"variation_{idx + 1}.png"
-                                )
+            _grid(range(num_images), show_variation)
 
 
 def main():
@@ -464,6 +704,7 @@ def main():
         initial_sidebar_state="expanded"
     )
 
+    preload_handlers()
     load_css()
     init_session_state()
     render_header()
@@ -13,6 +13,9 @@ HF_API_TOKEN = os.getenv("HF_API_TOKEN")  # get API key from .env
 # NEW
 HF_IMG2IMG_URL = "https://router.huggingface.co/hf-inference/models/stabilityai/stable-diffusion-xl-refiner-1.0"
 
+# === DeepAI API Settings ===
+DEEPAI_API_KEY = os.getenv("DEEPAI_API_KEY")  # get API key from .env
+
 # === Image Settings ===
 MAX_FILE_SIZE_MB = 5  # maximum uploadable file size
 ALLOWED_EXTENSIONS = ["png", "jpg", "jpeg"]  # accepted file formats
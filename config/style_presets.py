@@ -76,4 +76,13 @@ ALL_STYLES = {
     "🎨 Artistic": ARTISTIC_STYLES,
     "📷 Photo": PHOTO_STYLES,
     "✨ Fantasy": FANTASY_STYLES
-}
\ No newline at end of file
+}
+
+# === Precomputed lookups (built once at import, reused on every rerun) ===
+ALL_CATEGORIES = tuple(ALL_STYLES.keys())  # category names in display order
+STYLE_KEYS = {category: tuple(styles.keys()) for category, styles in ALL_STYLES.items()}  # style names per category
+FLAT_STYLES = {
+    (category, style_name): config
+    for category, styles in ALL_STYLES.items()
+    for style_name, config in styles.items()
+}  # (category, style) -> style config
@@ -5,8 +5,8 @@ Before/after views and image selection tools.
 
 import streamlit as st  # web UI framework
 from PIL import Image  # for image processing
+import numpy as np  # for fast pixel copies
 import io  # for byte stream operations
-import base64  # for base64 encoding
 
 
 def display_before_after(original, transformed):
@@ -23,18 +23,89 @@ def display_before_after(original, transformed):
         st.image(transformed, width="stretch")
 
 
+def _to_png_bytes(image):
+    """Returns PNG bytes for a PIL Image (bytes are passed through)."""
+
+    if isinstance(image, bytes):
+        return image
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+# Cached slider composites per pair (one PNG per slider position)
+_MAX_COMPOSITES = 32
+
+# Longest edge of the slider preview in pixels
+_PREVIEW_MAX_SIZE = 1280
+
+
+def _prepared_pair(orig_bytes, trans_bytes):
+    """
+    Decodes the original and the resized transformed image once per pair.
+
+    Kept in st.session_state instead of st.cache_data so slider ticks don't
+    re-hash the image bytes; the pair is only compared (memcmp) for changes.
+    """
+
+    entry = st.session_state.get("_slider_pair")
+
+    if entry is None or entry["orig"] != orig_bytes or entry["trans"] != trans_bytes:
+        original = Image.open(io.BytesIO(orig_bytes)).convert("RGB")
+        transformed = Image.open(io.BytesIO(trans_bytes)).convert("RGB")
+
+        # Cap the preview size - the browser scales it down anyway
+        scale = min(1.0, _PREVIEW_MAX_SIZE / max(original.size))
+        if scale < 1:
+            preview_size = (max(1, int(original.width * scale)), max(1, int(original.height * scale)))
+            original = original.resize(preview_size, Image.Resampling.BILINEAR)
+
+        if transformed.size != original.size:  # no resize pass when sizes already match
+            transformed = transformed.resize(original.size, Image.Resampling.BILINEAR)  # preview only
+
+        entry = {
+            "orig": orig_bytes,
+            "trans": trans_bytes,
+            "orig_arr": np.asarray(original),
+            "trans_arr": np.asarray(transformed),
+            "composites": {}  # split_pixel -> PNG bytes
+        }
+        st.session_state["_slider_pair"] = entry
+
+    return entry
+
+
+def _compose_split(orig_arr, trans_arr, split_pixel):
+    """Builds the split preview for one slider position and returns it as PNG bytes."""
+
+    # Left part from original, right part from transformed (plain array copies)
+    combined = np.empty_like(orig_arr)
+    combined[:, :split_pixel] = orig_arr[:, :split_pixel]
+    combined[:, split_pixel:] = trans_arr[:, split_pixel:]
+
+    # ADD WHITE VERTICAL LINE (5 pixels wide)
+    line_width = 5
+    combined[:, max(0, split_pixel - line_width // 2):split_pixel + line_width // 2 + 1] = 255
+
+    return _to_png_bytes(Image.fromarray(combined, "RGB"))
+
+
 def display_slider_comparison(original, transformed):
     """
-    REAL Before/After slider - splits image with PIL + adds vertical line.
+    REAL Before/After slider - splits image with NumPy + adds vertical line.
     Controlled with Streamlit slider, INSTANT update.
+
+    original / transformed can be PIL Images or PNG bytes; the decoded pair and
+    the composites live in session_state, so moving back to a position is a lookup.
     """
 
     st.markdown("### 🔍 Interactive Comparison")
     st.markdown("*Move the slider - slide right to see transformed, slide left to see original*")
 
-    # Resize images to same dimensions
-    orig_width, orig_height = original.size
-    trans_resized = transformed.resize((orig_width, orig_height), Image.Resampling.LANCZOS)
+    # Resize images to same dimensions (once per pair)
+    pair = _prepared_pair(_to_png_bytes(original), _to_png_bytes(transformed))
+    orig_height, orig_width = pair["orig_arr"].shape[:2]
 
     # Slider (0-100 range)
     split_position = st.slider(
@@ -49,25 +120,12 @@ def display_slider_comparison(original, transformed):
     # Convert split point to pixels
     split_pixel = int((split_position / 100) * orig_width)
 
-    # Create new image
-    combined = Image.new('RGB', (orig_width, orig_height))
-
-    # Get left part from original (from 0 to split_pixel)
-    left_part = original.crop((0, 0, split_pixel, orig_height))
-    combined.paste(left_part, (0, 0))
-
-    # Get right part from transformed (from split_pixel to end)
-    right_part = trans_resized.crop((split_pixel, 0, orig_width, orig_height))
-    combined.paste(right_part, (split_pixel, 0))
-
-    # ADD WHITE VERTICAL LINE (5 pixels wide)
-    from PIL import ImageDraw
-    draw = ImageDraw.Draw(combined)
-    line_width = 5
-    draw.rectangle(
-        [(split_pixel - line_width // 2, 0), (split_pixel + line_width // 2, orig_height)],
-        fill='white'
-    )
+    composites = pair["composites"]
+    combined = composites.get(split_pixel)
+    if combined is None:
+        if len(composites) >= _MAX_COMPOSITES:
+            composites.pop(next(iter(composites)))  # drop the oldest position
+        combined = composites[split_pixel] = _compose_split(pair["orig_arr"], pair["trans_arr"], split_pixel)
 
     # Display image
     st.image(combined, width="stretch")
@@ -101,15 +159,18 @@ def display_image_grid(images, captions=None):
 
 
 def create_download_button(image, filename="transformed_image.png"):
-    """Creates an image download button."""
+    """Creates an image download button (accepts PIL Image or PNG bytes)."""
 
-    buffer = io.BytesIO()  # create buffer in memory
-    image.save(buffer, format="PNG")  # save image as PNG to buffer
-    buffer.seek(0)  # go to buffer start
+    if isinstance(image, bytes):  # already encoded, no need to re-encode
+        data = image
+    else:
+        buffer = io.BytesIO()  # create buffer in memory
+        image.save(buffer, format="PNG")  # save image as PNG to buffer
+        data = buffer.getvalue()
 
     st.download_button(
         label="📥 Download Image",  # button text
-        data=buffer,  # data to download
+        data=data,  # data to download
         file_name=filename,  # file name
         mime="image/png"  # file type
     )
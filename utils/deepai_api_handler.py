@@ -5,21 +5,26 @@ Manages image-to-image transformation requests through DeepAI platform.
 """
 
 import requests
-from PIL import Image
-import io
-import os
-from dotenv import load_dotenv
-
-load_dotenv()  # load variables from .env file
-
-# Get DeepAI API Key from .env file
-DEEPAI_API_KEY = os.getenv("DEEPAI_API_KEY")
+from functools import lru_cache
+from config.settings import DEEPAI_API_KEY
+from utils.http_client import create_session, download_image, MODEL_LOADING_RETRY
+from utils.image_loader import get_image_mime
 
 # DeepAI API endpoint
 API_BASE_URL = "https://api.deepai.org/api"
 
+# Shared session - keeps connections alive across calls, retries 503 "model loading"
+_SESSION = create_session(pool_connections=4, pool_maxsize=8, max_retries=MODEL_LOADING_RETRY)
+
+
+@lru_cache(maxsize=16)
+def _fetch_image(url):
+    """Downloads and decodes a result image once per URL (failed downloads are not cached)."""
 
-def transform_image(image_bytes, prompt="", strength=0.6, negative_prompt=""):
+    return download_image(_SESSION, url, timeout=30)  # streamed straight into PIL
+
+
+def transform_image(image_bytes, prompt="", strength=0.6, negative_prompt="", seed=None):
     """
     Transforms image using DeepAI API.
 
@@ -34,6 +39,7 @@ def transform_image(image_bytes, prompt="", strength=0.6, negative_prompt=""):
         prompt: Transformation instruction (text prompt)
         strength: Transformation strength (not directly supported in DeepAI, will be used in prompt)
         negative_prompt: Unwanted features (not available in DeepAI, will be ignored)
+        seed: Random seed (not available in DeepAI, will be ignored)
 
     Returns:
         tuple: (success status, result image or error message)
@@ -82,8 +88,9 @@ def transform_image(image_bytes, prompt="", strength=0.6, negative_prompt=""):
 
         # 4. Form data preparation
         # DeepAI expects multipart/form-data
+        mime_type, extension = get_image_mime(image_bytes)
         files = {
-            "image": ("image.png", image_bytes, "image/png")
+            "image": (f"image.{extension}", image_bytes, mime_type)
         }
 
         data = {
@@ -94,7 +101,7 @@ def transform_image(image_bytes, prompt="", strength=0.6, negative_prompt=""):
         print("   ⏳ Processing may take 5-20 seconds...")
 
         # 5. API call
-        response = requests.post(
+        response = _SESSION.post(
             endpoint,
             headers=headers,
             files=files,
@@ -135,14 +142,11 @@ def transform_image(image_bytes, prompt="", strength=0.6, negative_prompt=""):
 
         # 8. Download image
         print("   📥 Downloading image...")
-        image_response = requests.get(output_url, timeout=30)
-
-        if image_response.status_code != 200:
+        try:
+            result_image = _fetch_image(output_url).copy()  # copy - the cached image stays untouched
+        except requests.exceptions.HTTPError:
             return False, "Could not download image."
 
-        # Convert to PIL Image
-        result_image = Image.open(io.BytesIO(image_response.content))
-
         print(f"   📐 Result: {result_image.size}, {result_image.mode}")
         print("\n✨✨✨ SUCCESS! Image transformed with DeepAI! ✨✨✨\n")
 
@@ -6,28 +6,37 @@ UPDATE: Using new router.huggingface.co endpoint.
 Using non-gated models that work with free API.
 """
 
-from huggingface_hub import InferenceClient
 from PIL import Image
 import io
 import requests
-import base64
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from config.settings import HF_API_TOKEN
+from utils.http_client import create_session, MODEL_LOADING_RETRY
+from utils.image_loader import get_image_mime
 
+# Shared session - keeps connections alive across calls, retries 503 "model loading"
+_SESSION = create_session(pool_connections=4, pool_maxsize=8, max_retries=MODEL_LOADING_RETRY)
 
-def transform_image(image_bytes, prompt="", strength=0.6, negative_prompt=""):
+# Upper bound on concurrent model attempts (free tier rate-limits aggressively)
+MAX_PARALLEL_ATTEMPTS = 3
+
+
+def transform_image(image_bytes, prompt="", strength=0.6, negative_prompt="", seed=None):
     """
     Transforms image using Hugging Face Inference API.
 
     Strategy:
-    1. First try InstructPix2Pix (not gated, ideal for img2img)
-    2. Then try other open models
-    3. Last resort: direct API call
+    1. Try InstructPix2Pix, then the other open models concurrently
+    2. Last resort: direct API calls (same order)
+    The preferred model always gets the first chance; among the fallbacks
+    the first successful response wins.
 
     Args:
         image_bytes: Image byte data
         prompt: Transformation guidance
         strength: Transformation strength (0.0-1.0)
         negative_prompt: Unwanted features
+        seed: Random seed for reproducible results (None = random)
 
     Returns:
         tuple: (success status, result image or error message)
@@ -82,70 +91,24 @@ def transform_image(image_bytes, prompt="", strength=0.6, negative_prompt=""):
     print("-" * 50)
 
     try:
+        # Imported lazily: huggingface_hub is heavy and only needed when HF is selected
+        from huggingface_hub import InferenceClient
+
         client = InferenceClient(token=HF_API_TOKEN)
         print("✅ InferenceClient created")
 
-        for model_info in models_to_try:
-            model_name = model_info["name"]
-            print(f"\n{'─' * 60}")
-            print(f"🤖 Model: {model_name}")
-            print(f"📋 {model_info['description']}")
-            print(f"{'─' * 60}")
+        attempts = [
+            (_try_client_model, (client, model_info, image_bytes, prompt, instruct_prompt,
+                                 strength, negative_prompt, seed))
+            for model_info in models_to_try
+        ]
 
-            try:
-                print("🌐 Making API call...")
-
-                # Different approach based on model type
-                if model_info["type"] == "instruct":
-                    # Special prompt for InstructPix2Pix
-                    result = client.image_to_image(
-                        image=image_bytes,
-                        prompt=instruct_prompt,
-                        model=model_name,
-                        strength=strength,
-                        guidance_scale=7.5
-                    )
-                else:
-                    # Standard call for other models
-                    result = client.image_to_image(
-                        image=image_bytes,
-                        prompt=prompt,
-                        negative_prompt=negative_prompt if negative_prompt else None,
-                        model=model_name,
-                        strength=strength,
-                        guidance_scale=7.5
-                    )
-
-                # Check result
-                if isinstance(result, Image.Image):
-                    print(f"✅ SUCCESS! Size: {result.size}")
-                    print("\n" + "✨" * 25)
-                    print("IMAGE SUCCESSFULLY TRANSFORMED!")
-                    print("✨" * 25 + "\n")
-                    return True, result
-
-                elif hasattr(result, 'read'):
-                    result = Image.open(result)
-                    print(f"✅ SUCCESS! Size: {result.size}")
-                    return True, result
-
-            except Exception as e:
-                error_msg = str(e)
-                print(f"❌ Error: {error_msg[:100]}...")
-
-                # Error analysis
-                if "not supported" in error_msg.lower():
-                    print("   ⚠️ This model doesn't support image-to-image")
-                elif "503" in error_msg or "loading" in error_msg.lower():
-                    print("   ⏳ Model is loading, wait 30 seconds and try again")
-                elif "gated" in error_msg.lower() or "access" in error_msg.lower():
-                    print("   🔒 This model requires access permission")
-                elif "401" in error_msg:
-                    print("   🔑 Token issue - but trying other models")
-                elif "404" in error_msg or "not found" in error_msg.lower():
-                    print("   🔭 Model not found or no access")
-
-                continue
+        success, result = _first_success(attempts)
+        if success:
+            return True, result
+
+    except ImportError:
+        print("⚠️ huggingface_hub not installed, skipping InferenceClient")
 
     except Exception as e:
         print(f"❌ InferenceClient error: {str(e)[:100]}")
@@ -154,127 +117,255 @@ def transform_image(image_bytes, prompt="", strength=0.6, negative_prompt=""):
     print("\n🔄 Method 2: Direct HTTP API (router.huggingface.co)")
     print("-" * 50)
 
-    # Base64 encode
-    image_b64 = base64.b64encode(image_bytes).decode('utf-8')
-
     direct_models = [
         "timbrooks/instruct-pix2pix",
         "stabilityai/stable-diffusion-xl-refiner-1.0"
     ]
 
+    attempts = [
+        (_try_direct_model, (model_name, image_bytes, instruct_prompt, strength, seed))
+        for model_name in direct_models
+    ]
+
+    success, result = _first_success(attempts)
+    if success:
+        return True, result
+
+    # === ALL ATTEMPTS FAILED ===
+    print("\n" + "=" * 70)
+    print("❌ ALL MODELS FAILED")
+    print("=" * 70)
+
+    error_message = """
+No suitable model found in Hugging Face free API.
+
+Possible solutions:
+1. Wait a few minutes and try again (models might be loading)
+2. Try a different platform (DeepAI, Stability AI, Replicate)
+3. Upgrade to Hugging Face Pro account
+
+Note: Image-to-image support is limited in Hugging Face free tier.
+"""
+
+    return False, error_message.strip()
+
+
+def _first_success(attempts, max_workers=MAX_PARALLEL_ATTEMPTS):
+    """
+    Runs (function, args) attempts and returns the first successful result.
+
+    The first attempt is the preferred model and runs on its own, so a fallback
+    can't win just by answering sooner. Only if it fails are the remaining
+    attempts raced concurrently.
+    """
+
+    (func, args), fallbacks = attempts[0], attempts[1:]
+    success, result = _run_attempt(func, args)
+
+    if not success and fallbacks:
+        success, result = _race_attempts(fallbacks, max_workers)
+
+    if success:
+        print("\n" + "✨" * 25)
+        print("IMAGE SUCCESSFULLY TRANSFORMED!")
+        print("✨" * 25 + "\n")
+
+    return success, result
+
+
+def _run_attempt(func, args):
+    """Runs a single attempt, treating exceptions as failure."""
+
+    try:
+        return func(*args)
+    except Exception as e:
+        print(f"❌ Attempt error: {str(e)[:100]}")
+        return False, None
+
+
+def _race_attempts(attempts, max_workers):
+    """
+    Runs attempts concurrently and returns the first successful result.
+
+    Workers are bounded to stay inside free-tier rate limits. Pending attempts are
+    cancelled once one succeeds; already running requests finish in the background.
+    """
+
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(attempts)))
+    futures = [executor.submit(_run_attempt, func, args) for func, args in attempts]
+
+    try:
+        for future in as_completed(futures):
+            success, result = future.result()
+            if success:
+                return True, result
+    finally:
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+    return False, None
+
+
+def _try_client_model(client, model_info, image_bytes, prompt, instruct_prompt,
+                      strength, negative_prompt, seed):
+    """Single InferenceClient attempt. Returns (success, image or None)."""
+
+    model_name = model_info["name"]
+    print(f"\n🤖 Model: {model_name} - {model_info['description']}")
+
+    try:
+        print(f"🌐 Making API call ({model_name})...")
+
+        # Different approach based on model type
+        if model_info["type"] == "instruct":
+            # Special prompt for InstructPix2Pix
+            result = client.image_to_image(
+                image=image_bytes,
+                prompt=instruct_prompt,
+                model=model_name,
+                strength=strength,
+                guidance_scale=7.5,
+                seed=seed
+            )
+        else:
+            # Standard call for other models
+            result = client.image_to_image(
+                image=image_bytes,
+                prompt=prompt,
+                negative_prompt=negative_prompt if negative_prompt else None,
+                model=model_name,
+                strength=strength,
+                guidance_scale=7.5,
+                seed=seed
+            )
+
+        # Check result
+        if isinstance(result, Image.Image):
+            print(f"✅ SUCCESS ({model_name})! Size: {result.size}")
+            return True, result
+
+        elif hasattr(result, 'read'):
+            result = Image.open(result)
+            print(f"✅ SUCCESS ({model_name})! Size: {result.size}")
+            return True, result
+
+    except Exception as e:
+        error_msg = str(e)
+        print(f"❌ {model_name}: {error_msg[:100]}...")
+
+        # Error analysis
+        if "not supported" in error_msg.lower():
+            print("   ⚠️ This model doesn't support image-to-image")
+        elif "503" in error_msg or "loading" in error_msg.lower():
+            print("   ⏳ Model is loading, wait 30 seconds and try again")
+        elif "gated" in error_msg.lower() or "access" in error_msg.lower():
+            print("   🔒 This model requires access permission")
+        elif "401" in error_msg:
+            print("   🔑 Token issue - but trying other models")
+        elif "404" in error_msg or "not found" in error_msg.lower():
+            print("   🔭 Model not found or no access")
+
+    return False, None
+
+
+def _try_direct_model(model_name, image_bytes, instruct_prompt, strength, seed):
+    """Single direct HTTP attempt. Returns (success, image or None)."""
+
+    # NEW ENDPOINT - using router.huggingface.co
+    api_url = f"https://router.huggingface.co/hf-inference/models/{model_name}"
+
+    # Raw binary body - no base64 (+33%) and no JSON encoding of the image
+    mime_type, _ = get_image_mime(image_bytes)
     headers = {
         "Authorization": f"Bearer {HF_API_TOKEN}",
-        "Content-Type": "application/json"
+        "Content-Type": mime_type
     }
 
-    for model_name in direct_models:
-        print(f"\n🤖 Direct API: {model_name}")
+    params = {
+        "prompt": instruct_prompt,
+        "strength": strength,
+        "guidance_scale": 7.5
+    }
 
-        # NEW ENDPOINT - using router.huggingface.co
-        api_url = f"https://router.huggingface.co/hf-inference/models/{model_name}"
+    if seed is not None:
+        params["seed"] = seed
 
-        try:
-            # Prepare payload
-            payload = {
-                "inputs": {
-                    "image": image_b64,
-                    "prompt": instruct_prompt
-                },
-                "parameters": {
-                    "strength": strength,
-                    "guidance_scale": 7.5
-                }
+    try:
+        print(f"🌐 Sending HTTP POST (binary): {api_url[:50]}...")
+        response = _SESSION.post(api_url, headers=headers, data=image_bytes, params=params, timeout=120)
+
+        print(f"📥 {model_name}: HTTP {response.status_code}")
+
+        if response.status_code == 200:
+            # Success - image returned
+            result_image = Image.open(io.BytesIO(response.content))
+            print(f"✅ SUCCESS ({model_name})! Size: {result_image.size}")
+            return True, result_image
+
+        elif response.status_code == 503:
+            # Model is loading
+            try:
+                error_data = response.json()
+                wait_time = error_data.get("estimated_time", 30)
+                print(f"⏳ Model is loading... Estimated time: {wait_time:.0f} seconds")
+            except:
+                print("⏳ Model is loading...")
+
+        elif response.status_code == 401:
+            print("🔑 Authorization error")
+
+        elif response.status_code == 404:
+            print("🔭 Model not found")
+
+        elif response.status_code == 422:
+            # Unprocessable Entity - endpoint wants JSON, fall back to base64 payloads
+            print("⚠️ Binary body not accepted, trying JSON payloads...")
+
+            import base64  # only needed on this fallback path
+
+            image_b64 = base64.b64encode(image_bytes).decode('utf-8')
+
+            json_headers = {
+                "Authorization": f"Bearer {HF_API_TOKEN}",
+                "Content-Type": "application/json"
             }
 
-            print(f"🌐 Sending HTTP POST: {api_url[:50]}...")
-            response = requests.post(api_url, headers=headers, json=payload, timeout=120)
-
-            print(f"📥 Response: HTTP {response.status_code}")
-
-            if response.status_code == 200:
-                # Success - image returned
-                result_image = Image.open(io.BytesIO(response.content))
-                print(f"✅ SUCCESS! Size: {result_image.size}")
-                print("\n" + "✨" * 25)
-                print("IMAGE SUCCESSFULLY TRANSFORMED!")
-                print("✨" * 25 + "\n")
-                return True, result_image
-
-            elif response.status_code == 503:
-                # Model is loading
-                try:
-                    error_data = response.json()
-                    wait_time = error_data.get("estimated_time", 30)
-                    print(f"⏳ Model is loading... Estimated time: {wait_time:.0f} seconds")
-                except:
-                    print("⏳ Model is loading...")
-                continue
-
-            elif response.status_code == 401:
-                print("🔑 Authorization error")
-                continue
-
-            elif response.status_code == 404:
-                print("🔭 Model not found")
-                continue
-
-            elif response.status_code == 422:
-                # Unprocessable Entity - payload format might be wrong
-                print("⚠️ Payload format incompatible, trying alternative...")
-
-                # Alternative payload format
-                alt_payload = {
+            json_payloads = [
+                {
+                    "inputs": {"image": image_b64, "prompt": instruct_prompt},
+                    "parameters": {k: v for k, v in params.items() if k != "prompt"}
+                },
+                {
                     "inputs": image_b64,
-                    "parameters": {
-                        "prompt": instruct_prompt,
-                        "strength": strength,
-                        "guidance_scale": 7.5
-                    }
+                    "parameters": params
                 }
+            ]
 
-                response2 = requests.post(api_url, headers=headers, json=alt_payload, timeout=120)
+            for json_payload in json_payloads:
+                response2 = _SESSION.post(api_url, headers=json_headers, json=json_payload, timeout=120)
 
                 if response2.status_code == 200:
                     result_image = Image.open(io.BytesIO(response2.content))
-                    print(f"✅ SUCCESS! Size: {result_image.size}")
+                    print(f"✅ SUCCESS ({model_name})! Size: {result_image.size}")
                     return True, result_image
-                else:
-                    print(f"❌ Alternative also failed: HTTP {response2.status_code}")
-                continue
-
-            else:
-                try:
-                    error_data = response.json()
-                    print(f"❌ Error: {error_data.get('error', 'Unknown error')[:100]}")
-                except:
-                    print(f"❌ HTTP Error: {response.status_code}")
-                continue
-
-        except requests.exceptions.Timeout:
-            print("⏱️ Timeout - Model took too long")
-            continue
 
-        except Exception as e:
-            print(f"❌ Request error: {str(e)[:100]}")
-            continue
-
-    # === ALL ATTEMPTS FAILED ===
-    print("\n" + "=" * 70)
-    print("❌ ALL MODELS FAILED")
-    print("=" * 70)
+                print(f"❌ JSON payload also failed: HTTP {response2.status_code}")
 
-    error_message = """
-No suitable model found in Hugging Face free API.
+        else:
+            try:
+                error_data = response.json()
+                print(f"❌ Error: {error_data.get('error', 'Unknown error')[:100]}")
+            except:
+                print(f"❌ HTTP Error: {response.status_code}")
 
-Possible solutions:
-1. Wait a few minutes and try again (models might be loading)
-2. Try a different platform (DeepAI, Stability AI, Replicate)
-3. Upgrade to Hugging Face Pro account
+    except requests.exceptions.Timeout:
+        print(f"⏱️ Timeout - {model_name} took too long")
 
-Note: Image-to-image support is limited in Hugging Face free tier.
-"""
+    except Exception as e:
+        print(f"❌ Request error: {str(e)[:100]}")
 
-    return False, error_message.strip()
+    return False, None
 
 
 def transform_with_style(image_bytes, style_config):
@@ -305,6 +396,8 @@ if __name__ == "__main__":
 
         # Simple API test
         try:
+            from huggingface_hub import InferenceClient
+
             client = InferenceClient(token=HF_API_TOKEN)
             print("✅ InferenceClient created")
             print("\n💡 Handler ready to use!")
@@ -0,0 +1,91 @@
+"""
+Shared HTTP session factory for the API handlers.
+Pooled keep-alive connections so repeated calls skip the TCP + TLS handshake.
+"""
+
+import requests  # HTTP client
+from PIL import Image  # for streamed image downloads
+from requests.adapters import HTTPAdapter  # connection pool settings
+from urllib3.util.retry import Retry  # retry policy
+
+# Retry policy for inference endpoints that answer 503 while a model is loading.
+# POST is included (the request was not processed) and the final 503 is returned
+# instead of raised so the handlers can still report it.
+MODEL_LOADING_RETRY = Retry(
+    total=2,
+    backoff_factor=0.3,
+    status_forcelist=[503],
+    allowed_methods=None,
+    raise_on_status=False
+)
+
+class CappedRetry(Retry):
+    """Retry that honours Retry-After, but never waits longer than max_retry_after seconds."""
+
+    max_retry_after = 60
+
+    def parse_retry_after(self, retry_after):
+        return min(super().parse_retry_after(retry_after), self.max_retry_after)
+
+
+# Retry policy for rate-limited / overloaded APIs: exponential backoff
+# on 429 and gateway errors, waiting for Retry-After when the server sends one.
+# Read errors are not retried: the server may already have accepted (and billed)
+# the generation, so only rejected requests and failed connects are re-sent.
+# Retry-After is capped so a large value can't park a worker thread indefinitely.
+RATE_LIMIT_RETRY = CappedRetry(
+    total=5,
+    read=0,
+    other=0,
+    backoff_factor=1.5,
+    status_forcelist=[429, 502, 503, 504],
+    allowed_methods=["POST"],
+    respect_retry_after_header=True,
+    raise_on_status=False
+)
+
+
+def create_session(pool_connections=8, pool_maxsize=8, max_retries=None):
+    """
+    Creates a requests.Session with a pooled HTTPAdapter.
+
+    Args:
+        pool_connections: Number of host pools to cache
+        pool_maxsize: Maximum connections kept per host (>= parallel variations)
+        max_retries: urllib3 Retry policy (default: 3 retries with backoff)
+
+    Returns:
+        requests.Session: Session to reuse for the lifetime of the process
+    """
+
+    if max_retries is None:
+        max_retries = Retry(total=3, backoff_factor=0.5)  # connection errors, idempotent methods only
+
+    adapter = HTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        max_retries=max_retries
+    )
+
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def download_image(session, url, timeout=30):
+    """
+    Downloads an image and decodes it straight from the response stream.
+
+    No response.content / BytesIO copies: PIL reads from the socket into its
+    own pixel buffer. Raises requests.HTTPError for non-2xx responses.
+    """
+
+    with session.get(url, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+
+        response.raw.decode_content = True  # handle gzip/deflate transfer encoding
+        image = Image.open(response.raw)
+        image.load()  # read everything before the connection is released
+
+    return image
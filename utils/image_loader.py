@@ -5,8 +5,25 @@ Validates user uploaded images and prepares them for API.
 
 from PIL import Image  # image processing library
 import io  # for byte stream operations
+import base64  # for data URI payloads
+import hashlib  # for content-keyed caches
+import threading  # cache lock (handlers run in worker threads)
+from collections import OrderedDict  # small LRU cache
+import numpy as np  # for array conversion (OpenCV path, alpha blend)
+
+try:
+    import cv2  # optional - SIMD-accelerated resize
+except ImportError:
+    cv2 = None
 from config.settings import MAX_FILE_SIZE_MB, ALLOWED_EXTENSIONS, DEFAULT_OUTPUT_SIZE  # central settings
 
+_ALLOWED_EXTENSION_SET = frozenset(ALLOWED_EXTENSIONS)  # O(1) membership checks
+
+# Base64 encodings of recent uploads, keyed by content digest
+_BASE64_CACHE = OrderedDict()
+_BASE64_CACHE_SIZE = 8
+_BASE64_CACHE_LOCK = threading.Lock()
+
 
 def validate_image(uploaded_file):
     """Checks if the uploaded file is valid."""
@@ -15,7 +32,7 @@ def validate_image(uploaded_file):
         return False, "Please upload an image."
 
     file_extension = uploaded_file.name.split(".")[-1].lower()  # get file extension
-    if file_extension not in ALLOWED_EXTENSIONS:  # if not in allowed formats
+    if file_extension not in _ALLOWED_EXTENSION_SET:  # if not in allowed formats
         return False, f"Unsupported format. Allowed: {ALLOWED_EXTENSIONS}"
 
     file_size_mb = uploaded_file.size / (1024 * 1024)  # convert bytes to MB
@@ -25,15 +42,34 @@ def validate_image(uploaded_file):
     return True, "Image is valid."  # passed all checks
 
 
+def validate_image_bytes(file_bytes, name):
+    """Checks already-read upload bytes without decoding the image."""
+
+    if not file_bytes:  # if nothing uploaded
+        return False, "Please upload an image."
+
+    file_extension = name.split(".")[-1].lower()  # get file extension
+    if file_extension not in _ALLOWED_EXTENSION_SET:  # if not in allowed formats
+        return False, f"Unsupported format. Allowed: {ALLOWED_EXTENSIONS}"
+
+    file_size_mb = len(file_bytes) / (1024 * 1024)  # convert bytes to MB
+    if file_size_mb > MAX_FILE_SIZE_MB:  # if exceeds size limit
+        return False, f"File too large. Maximum: {MAX_FILE_SIZE_MB}MB"
+
+    return True, "Image is valid."  # passed all checks
+
+
 def load_and_preprocess(uploaded_file):
     """Loads image, converts to RGB and resizes."""
 
     image = Image.open(uploaded_file)  # open image
 
     if image.mode == "RGBA":  # if has transparent background
-        background = Image.new("RGB", image.size, (255, 255, 255))  # create white background
-        background.paste(image, mask=image.split()[3])  # paste using alpha channel
-        image = background
+        arr = np.asarray(image)
+        alpha = arr[..., 3:4].astype(np.uint16)  # alpha channel, kept 3D for broadcasting
+        rgb = arr[..., :3].astype(np.uint16)
+        blended = (rgb * alpha + 255 * (255 - alpha)) // 255  # blend over white (integer math)
+        image = Image.fromarray(blended.astype(np.uint8), "RGB")
     elif image.mode != "RGB":  # if not RGB
         image = image.convert("RGB")  # convert to RGB
 
@@ -41,16 +77,80 @@ def load_and_preprocess(uploaded_file):
 
 
 def resize_image(image, max_size=DEFAULT_OUTPUT_SIZE):
-    """Resizes image while maintaining aspect ratio."""
+    """Resizes image while maintaining aspect ratio (downscale only)."""
 
-    image.thumbnail(max_size, Image.Resampling.LANCZOS)  # highest quality resize algorithm
-    return image
+    if cv2 is None or image.mode != "RGB":  # OpenCV not installed or non-RGB image, use PIL
+        image.thumbnail(max_size, Image.Resampling.LANCZOS)  # highest quality resize algorithm
+        return image
+
+    scale = min(max_size[0] / image.width, max_size[1] / image.height)
+    if scale >= 1:  # already fits, nothing to do
+        return image
 
+    new_size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    resized = cv2.resize(np.asarray(image), new_size, interpolation=cv2.INTER_AREA)  # area averaging for downscale
+    return Image.fromarray(resized, "RGB")
 
-def image_to_bytes(image):
-    """Converts PIL Image object to byte array (required for API)."""
+
+def image_to_bytes(image, format="JPEG", quality=85):
+    """
+    Converts PIL Image object to byte array (required for API).
+    JPEG by default (much smaller and faster to encode than PNG for photos);
+    images with transparency/palette fall back to PNG.
+    WEBP falls back to JPEG when Pillow has no WebP encoder.
+    """
 
     byte_stream = io.BytesIO()  # create byte stream in memory
-    image.save(byte_stream, format="PNG")  # save as PNG
-    byte_stream.seek(0)  # go to stream start
-    return byte_stream.getvalue()  # return byte data
\ No newline at end of file
+
+    if format == "WEBP":
+        try:
+            image.save(byte_stream, format="WEBP", quality=quality, method=4)  # ~30% smaller than JPEG
+            return byte_stream.getvalue()
+        except (KeyError, OSError):  # Pillow built without libwebp
+            byte_stream = io.BytesIO()
+            format = "JPEG"
+
+    if format == "JPEG" and image.mode not in ("RGB", "L"):  # JPEG can't keep alpha
+        format = "PNG"
+
+    if format == "JPEG":
+        image.save(byte_stream, format="JPEG", quality=quality, optimize=False)  # save as JPEG
+    else:
+        image.save(byte_stream, format=format)  # save in requested format
+    return byte_stream.getvalue()  # whole buffer, independent of stream position
+
+
+def get_image_mime(image_bytes):
+    """Detects image type from magic bytes, returns (mime type, file extension)."""
+
+    if image_bytes[:8] == b"\x89PNG\r\n\x1a\n":
+        return "image/png", "png"
+    if image_bytes[:3] == b"\xff\xd8\xff":
+        return "image/jpeg", "jpg"
+    if image_bytes[:4] == b"RIFF" and image_bytes[8:12] == b"WEBP":
+        return "image/webp", "webp"
+    return "image/png", "png"  # default (previous behavior)
+
+
+def get_base64(image_bytes):
+    """
+    Returns the base64 encoding (bytes) of image_bytes, cached by content.
+    Style fan-out and parallel variations send the same upload many times.
+    """
+
+    key = hashlib.blake2b(image_bytes, digest_size=16).digest()
+
+    with _BASE64_CACHE_LOCK:
+        encoded = _BASE64_CACHE.get(key)
+        if encoded is not None:
+            _BASE64_CACHE.move_to_end(key)  # mark as recently used
+            return encoded
+
+    encoded = base64.b64encode(image_bytes)
+
+    with _BASE64_CACHE_LOCK:
+        _BASE64_CACHE[key] = encoded
+        if len(_BASE64_CACHE) > _BASE64_CACHE_SIZE:
+            _BASE64_CACHE.popitem(last=False)  # drop least recently used
+
+    return encoded
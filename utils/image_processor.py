@@ -3,25 +3,41 @@ Image processing and manipulation functions.
 Resizing, comparison and multiple variation operations.
 """
 
-from PIL import Image, ImageEnhance, ImageFilter  # image processing tools
+from PIL import Image, ImageEnhance, ImageFilter, ImageStat  # image processing tools
 import io  # for byte stream operations
+import numpy as np  # for fast pixel copies
 import random  # for random seed generation
+from concurrent.futures import ThreadPoolExecutor  # for parallel conversions
 
 
 def create_side_by_side(original, transformed, spacing=20):
     """Combines two images side by side (for comparison)."""
 
-    original = original.convert("RGB")  # convert to RGB for format compatibility
-    transformed = transformed.convert("RGB")
+    if original.mode != "RGB":  # convert to RGB for format compatibility (only if needed)
+        original = original.convert("RGB")
+    if transformed.mode != "RGB":
+        transformed = transformed.convert("RGB")
 
     total_width = original.width + transformed.width + spacing  # total width
     max_height = max(original.height, transformed.height)  # the tallest one
 
-    combined = Image.new("RGB", (total_width, max_height), (255, 255, 255))  # canvas with white background
-    combined.paste(original, (0, 0))  # paste original on the left
-    combined.paste(transformed, (original.width + spacing, 0))  # paste transformed on the right
+    combined = np.full((max_height, total_width, 3), 255, dtype=np.uint8)  # canvas with white background
+    combined[:original.height, :original.width] = np.asarray(original)  # original on the left
+    right = original.width + spacing
+    combined[:transformed.height, right:] = np.asarray(transformed)  # transformed on the right
 
-    return combined
+    return Image.fromarray(combined, "RGB")
+
+
+def create_thumbnail_bytes(image, max_size=(384, 384), quality=85):
+    """Creates a small WebP preview (for grid display)."""
+
+    thumb = image.copy()  # keep the full-resolution original intact
+    thumb.thumbnail(max_size, Image.Resampling.LANCZOS)  # maintain aspect ratio
+
+    buffer = io.BytesIO()
+    thumb.save(buffer, format="WEBP", quality=quality)  # much smaller than PNG
+    return buffer.getvalue()
 
 
 def generate_random_seed():
@@ -30,6 +46,24 @@ def generate_random_seed():
     return random.randint(1, 2147483647)  # random number in 32-bit integer range
 
 
+def images_to_arrays(images):
+    """
+    Converts images to RGB uint8 arrays, in parallel for multiple images.
+    Pillow releases the GIL while decoding/converting, so threads overlap.
+    """
+
+    def to_array(img):
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        return np.asarray(img)
+
+    if len(images) < 2:
+        return [to_array(img) for img in images]
+
+    with ThreadPoolExecutor(max_workers=min(len(images), 8)) as pool:
+        return list(pool.map(to_array, images))
+
+
 def create_image_grid(images, columns=2, spacing=10):
     """Combines multiple images in a grid layout."""
 
@@ -44,28 +78,39 @@ def create_image_grid(images, columns=2, spacing=10):
     grid_width = columns * img_width + (columns - 1) * spacing  # grid total width
     grid_height = rows * img_height + (rows - 1) * spacing  # grid total height
 
-    grid = Image.new("RGB", (grid_width, grid_height), (255, 255, 255))  # white canvas
+    grid = np.full((grid_height, grid_width, 3), 255, dtype=np.uint8)  # white canvas
 
-    for idx, img in enumerate(images):  # place each image in order
-        row = idx // columns  # which row
-        col = idx % columns  # which column
+    for idx, arr in enumerate(images_to_arrays(images)):  # place each image in order
+        tile = arr[:img_height, :img_width]  # clip to the reference cell size
+        row, col = divmod(idx, columns)  # which row / column
         x = col * (img_width + spacing)  # x coordinate
         y = row * (img_height + spacing)  # y coordinate
-        grid.paste(img, (x, y))  # paste image
+        grid[y:y + tile.shape[0], x:x + tile.shape[1]] = tile  # copy pixels into the cell
 
-    return grid
+    return Image.fromarray(grid, "RGB")
 
 
 def apply_enhancement(image, brightness=1.0, contrast=1.0, sharpness=1.0):
     """Applies basic enhancements to image."""
 
-    if brightness != 1.0:  # brightness adjustment
-        enhancer = ImageEnhance.Brightness(image)
-        image = enhancer.enhance(brightness)
+    if brightness != 1.0 or contrast != 1.0:  # per-pixel affine - lookup tables instead of blends
+        if image.mode not in ("RGB", "RGBA", "L", "LA"):
+            image = image.convert("RGBA" if "transparency" in image.info or "A" in image.getbands() else "RGB")
+
+        bands = image.getbands()
+        identity = list(range(256))
+
+        def band_lut(levels):
+            lut = np.clip(levels, 0, 255).round().astype(np.uint8).tolist()
+            return [value for band in bands for value in (identity if band == "A" else lut)]  # alpha untouched
+
+        if brightness != 1.0:  # brightness
+            image = image.point(band_lut(np.arange(256) * brightness))
 
-    if contrast != 1.0:  # contrast adjustment
-        enhancer = ImageEnhance.Contrast(image)
-        image = enhancer.enhance(contrast)
+        if contrast != 1.0:  # contrast
+            # Pivot is the mean gray level of the clipped, brightened image (as ImageEnhance.Contrast)
+            mean = int(ImageStat.Stat(image.convert("L")).mean[0] + 0.5)
+            image = image.point(band_lut((np.arange(256) - mean) * contrast + mean))
 
     if sharpness != 1.0:  # sharpness adjustment
         enhancer = ImageEnhance.Sharpness(image)
@@ -82,5 +127,5 @@ def get_image_info(image):
         "height": image.height,  # height in pixels
         "mode": image.mode,  # color mode (RGB, RGBA etc)
         "format": image.format,  # file format
-        "size_kb": len(image.tobytes()) / 1024  # approximate size in KB
+        "size_kb": (image.width * image.height * len(image.getbands())) / 1024  # approximate size in KB (no pixel copy)
     }
\ No newline at end of file
@@ -5,12 +5,20 @@ Manages image-to-image transformation requests through Leonardo.ai platform.
 """
 
 import requests
-from PIL import Image
-import io
 import os
-import base64
+import json
 import time
+import random
+import asyncio
+import functools
 from dotenv import load_dotenv
+from utils.http_client import create_session, download_image
+from utils.image_loader import get_image_mime, get_base64
+
+try:
+    import httpx  # optional - HTTP/2 client for the API calls
+except ImportError:
+    httpx = None
 
 load_dotenv()  # load variables from .env file
 
@@ -20,8 +28,47 @@ LEONARDO_API_KEY = os.getenv("LEONARDO_API_KEY")
 # Leonardo.ai API endpoint
 API_BASE_URL = "https://cloud.leonardo.ai/api/rest/v1"
 
+# Maximum time to wait for a generation to finish (seconds)
+POLL_TIMEOUT = 120
+
+# Shared session - keeps connections alive across calls
+# (upload, generation start, every status poll and the CDN download reuse it)
+_SESSION = create_session(pool_connections=4, pool_maxsize=32)
+
+# HTTP/2 client for cloud.leonardo.ai (one multiplexed connection, HPACK headers).
+# Needs httpx[http2]; without it every call goes through _SESSION.
+_HTTP2_CLIENT = None
+if httpx is not None:
+    try:
+        _HTTP2_CLIENT = httpx.Client(
+            http2=True,
+            timeout=30,
+            limits=httpx.Limits(max_keepalive_connections=8)
+        )
+    except ImportError:  # h2 package missing
+        pass
+
+# Network errors from either client
+_REQUEST_ERRORS = (requests.exceptions.RequestException,) + ((httpx.HTTPError,) if httpx else ())
+
+
+def _api_post(url, headers, data=None, json=None):
+    """POST to the Leonardo API (HTTP/2 when available)."""
+
+    if _HTTP2_CLIENT is not None:
+        return _HTTP2_CLIENT.post(url, headers=headers, content=data, json=json)
+    return _SESSION.post(url, headers=headers, data=data, json=json)
+
+
+def _api_get(url, headers):
+    """GET from the Leonardo API (HTTP/2 when available)."""
+
+    if _HTTP2_CLIENT is not None:
+        return _HTTP2_CLIENT.get(url, headers=headers)
+    return _SESSION.get(url, headers=headers)
 
-def transform_image(image_bytes, prompt="", strength=0.6, negative_prompt=""):
+
+def transform_image(image_bytes, prompt="", strength=0.6, negative_prompt="", seed=None):
     """
     Transforms image using Leonardo.ai API.
 
@@ -37,6 +84,7 @@ def transform_image(image_bytes, prompt="", strength=0.6, negative_prompt=""):
             - 0.0 = completely original
             - 1.0 = completely new
         negative_prompt: Unwanted features
+        seed: Random seed for reproducible results (None = random)
 
     Returns:
         tuple: (success status, result image or error message)
@@ -59,9 +107,6 @@ def transform_image(image_bytes, prompt="", strength=0.6, negative_prompt=""):
         # 1. Upload init image
         print("📤 1. Uploading init image...")
 
-        # Convert image to base64
-        image_base64 = base64.b64encode(image_bytes).decode('utf-8')
-
         upload_url = f"{API_BASE_URL}/init-image"
         upload_headers = {
             "accept": "application/json",
@@ -69,13 +114,25 @@ def transform_image(image_bytes, prompt="", strength=0.6, negative_prompt=""):
             "content-type": "application/json"
         }
 
+        mime_type, extension = get_image_mime(image_bytes)
         upload_payload = {
-            "extension": "png",
-            "name": "init_image.png",
-            "imageDataUrl": f"data:image/png;base64,{image_base64}"
+            "extension": extension,
+            "name": f"init_image.{extension}"
         }
 
-        upload_response = requests.post(upload_url, json=upload_payload, headers=upload_headers)
+        # Build the JSON body as bytes and splice the base64 image in directly
+        # (no .decode(), no f-string copy, no json re-serialization of the blob).
+        # Base64 output only contains JSON-safe characters.
+        upload_body = b"".join([
+            json.dumps(upload_payload)[:-1].encode("utf-8"),  # without the closing brace
+            b', "imageDataUrl": "data:',
+            mime_type.encode("ascii"),
+            b";base64,",
+            get_base64(image_bytes),  # cached per upload
+            b'"}'
+        ])
+
+        upload_response = _api_post(upload_url, upload_headers, data=upload_body)
 
         if upload_response.status_code != 200:
             error_msg = upload_response.json().get('error', upload_response.text)
@@ -116,15 +173,18 @@ def transform_image(image_bytes, prompt="", strength=0.6, negative_prompt=""):
             "num_inference_steps": 30
         }
 
+        if seed is not None:
+            generation_payload["seed"] = seed
+
         print(f"   Model: Leonardo Phoenix")
         print(f"   Prompt: {generation_payload['prompt'][:60]}...")
         print(f"   Init strength: {strength}")
         print(f"   Steps: 30")
 
-        generation_response = requests.post(
+        generation_response = _api_post(
             generation_url,
-            json=generation_payload,
-            headers=generation_headers
+            generation_headers,
+            json=generation_payload
         )
 
         if generation_response.status_code != 200:
@@ -143,11 +203,16 @@ def transform_image(image_bytes, prompt="", strength=0.6, negative_prompt=""):
         print("⏳ 3. Generation in progress...")
         print("   ⏱️ This process may take 20-60 seconds...")
 
-        max_attempts = 60  # 60 second timeout
+        start_time = time.monotonic()
+        deadline = start_time + POLL_TIMEOUT  # wall-clock limit, independent of the backoff
         attempt = 0
 
-        while attempt < max_attempts:
-            time.sleep(2)  # Check every 2 seconds
+        while time.monotonic() < deadline:
+            # Exponential backoff with equal jitter: 0.5s, 1s, 2s, then capped at 4s
+            # (each wait lands in [delay/2, delay], so never longer than 4s)
+            delay = min(4.0, 0.5 * 2 ** min(attempt, 3))
+            delay = delay / 2 + random.uniform(0, delay / 2)
+            time.sleep(min(delay, max(0.0, deadline - time.monotonic())))
             attempt += 1
 
             status_url = f"{API_BASE_URL}/generations/{generation_id}"
@@ -156,7 +221,7 @@ def transform_image(image_bytes, prompt="", strength=0.6, negative_prompt=""):
                 "authorization": f"Bearer {LEONARDO_API_KEY}"
             }
 
-            status_response = requests.get(status_url, headers=status_headers)
+            status_response = _api_get(status_url, status_headers)
 
             if status_response.status_code != 200:
                 continue
@@ -165,7 +230,7 @@ def transform_image(image_bytes, prompt="", strength=0.6, negative_prompt=""):
             generation_info = status_data.get("generations_by_pk", {})
             status = generation_info.get("status")
 
-            print(f"   ⏳ Status: {status} ({attempt * 2}s)")
+            print(f"   ⏳ Status: {status} ({time.monotonic() - start_time:.0f}s)")
 
             if status == "COMPLETE":
                 print("   ✅ Generation completed!")
@@ -181,13 +246,12 @@ def transform_image(image_bytes, prompt="", strength=0.6, negative_prompt=""):
 
                 print(f"   📥 Downloading image: {image_url[:50]}...")
 
-                # Download image
-                image_response = requests.get(image_url)
-                if image_response.status_code != 200:
+                # Download image (streamed into PIL, no content copy)
+                try:
+                    result_image = download_image(_SESSION, image_url)
+                except requests.exceptions.HTTPError:
                     return False, "Could not download image."
 
-                result_image = Image.open(io.BytesIO(image_response.content))
-
                 print(f"   📐 Result: {result_image.size}, {result_image.mode}")
                 print("\n✨✨✨ SUCCESS! Image transformed with Leonardo.ai! ✨✨✨\n")
 
@@ -196,9 +260,9 @@ def transform_image(image_bytes, prompt="", strength=0.6, negative_prompt=""):
             elif status == "FAILED":
                 return False, "Generation failed."
 
-        return False, "Timeout: Generation did not complete within 60 seconds."
+        return False, f"Timeout: Generation did not complete within {POLL_TIMEOUT} seconds."
 
-    except requests.exceptions.RequestException as e:
+    except _REQUEST_ERRORS as e:
         error_msg = str(e)
         print(f"   ❌ Request Error: {error_msg[:150]}")
         return False, f"Leonardo.ai connection error: {error_msg[:150]}"
@@ -210,6 +274,22 @@ def transform_image(image_bytes, prompt="", strength=0.6, negative_prompt=""):
         return False, f"Leonardo.ai API error: {error_msg[:150]}"
 
 
+async def transform_image_async(image_bytes, prompt="", strength=0.6, negative_prompt="", seed=None):
+    """
+    Awaitable version of transform_image for asyncio callers.
+
+    The blocking request/poll cycle runs in the loop's default thread pool,
+    so several generations can be awaited together (e.g. asyncio.gather)
+    while sharing the pooled session.
+    """
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        None,
+        functools.partial(transform_image, image_bytes, prompt, strength, negative_prompt, seed)
+    )
+
+
 def transform_with_style(image_bytes, style_config):
     """Transforms using a preset style template."""
 
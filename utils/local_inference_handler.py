@@ -11,14 +11,35 @@ Model: Stable Diffusion XL Refiner 1.0
 """
 
 import torch
-from diffusers import StableDiffusionXLImg2ImgPipeline
+import torch.nn.functional as F
+from diffusers import StableDiffusionXLImg2ImgPipeline, DPMSolverMultistepScheduler
 from PIL import Image
 import io
 import os
+from utils.image_loader import get_image_mime
+from config.settings import DEFAULT_OUTPUT_SIZE
+
+# cuDNN autotuning + TF32 tensor cores for matmul/conv (Ampere and newer)
+torch.backends.cudnn.benchmark = True
+torch.backends.cuda.matmul.allow_tf32 = True
+torch.backends.cudnn.allow_tf32 = True
 
 # Global variable - load pipeline once, use continuously
 _pipeline = None
 _device = None
+_offloaded = False  # True while unload_pipeline() has parked the weights in RAM
+
+# INT8 UNet weights for 6GB cards (requires optimum-quanto)
+USE_INT8 = os.getenv("SDXL_INT8") == "1"
+
+# Multiple images can be generated in one pipeline call (see transform_images)
+SUPPORTS_BATCH = True
+
+# Denoising steps (DPM-Solver++ reaches the old 30-step quality at ~15)
+DEFAULT_STEPS = 15
+
+# Approximate activation memory per image in a 1024x1024 FP16 batch (GB)
+VRAM_PER_IMAGE_GB = 1.5
 
 
 def get_device():
@@ -44,9 +65,13 @@ def load_pipeline():
     Loads Stable Diffusion XL Refiner pipeline.
     Model is downloaded on first run (~6GB), loaded from cache on subsequent runs.
     """
-    global _pipeline
+    global _pipeline, _offloaded
 
     if _pipeline is not None:
+        if _offloaded:  # weights are parked in (pinned) RAM - just copy them back
+            print("♻️  Moving pipeline back to GPU...")
+            _pipeline = _pipeline.to(get_device())
+            _offloaded = False
         print("✅ Pipeline loaded from cache.")
         return _pipeline
 
@@ -70,9 +95,20 @@ def load_pipeline():
             model_id,
             torch_dtype=torch.float16 if device == "cuda" else torch.float32,
             use_safetensors=True,
+            low_cpu_mem_usage=True,
             variant="fp16" if device == "cuda" else None
         )
 
+        # DPM-Solver++ (Karras sigmas) - same quality in about half the steps
+        _pipeline.scheduler = DPMSolverMultistepScheduler.from_config(
+            _pipeline.scheduler.config,
+            use_karras_sigmas=True,
+            algorithm_type="dpmsolver++"
+        )
+
+        # Optional INT8 weight quantization (halves UNet VRAM, SDXL_INT8=1)
+        int8 = USE_INT8 and device == "cuda" and _quantize_unet(_pipeline)
+
         # Move to GPU
         _pipeline = _pipeline.to(device)
 
@@ -80,19 +116,31 @@ def load_pipeline():
         if device == "cuda":
             print(f"⚙️  2. Applying GPU optimizations...")
 
-            # Attention slicing (memory saving)
-            _pipeline.enable_attention_slicing(slice_size="auto")
-            print("   ✅ Attention slicing enabled")
+            # Memory-efficient attention (fused kernels - faster than attention slicing)
+            _enable_fast_attention(_pipeline)
 
-            # VAE slicing (memory saving)
-            _pipeline.enable_vae_slicing()
-            print("   ✅ VAE slicing enabled")
+            # VAE slicing (memory saving) - not needed when the UNet is INT8
+            if not int8:
+                _pipeline.enable_vae_slicing()
+                print("   ✅ VAE slicing enabled")
 
             # Model offloading (if VRAM is insufficient)
             # _pipeline.enable_model_cpu_offload()  # Enable if needed
 
             print(f"   ✅ FP16 precision enabled")
 
+            # NHWC layout - tensor-core friendly convolutions, no numerical change
+            _pipeline.unet.to(memory_format=torch.channels_last)
+            _pipeline.vae.to(memory_format=torch.channels_last)
+            print("   ✅ Channels-last memory format enabled")
+
+            # Compile the UNet (fused Triton kernels + CUDA graphs), torch >= 2.1
+            compiled = _torch_version() >= (2, 1) and _compile_unet(_pipeline)
+
+            # Eager mode: still run one pass so cuDNN autotunes its conv algorithms now
+            if not compiled:
+                _warmup(_pipeline)
+
         print("\n✨✨✨ Pipeline loaded successfully! ✨✨✨\n")
         return _pipeline
 
@@ -105,7 +153,137 @@ def load_pipeline():
         raise
 
 
-def transform_image(image_bytes, prompt="", strength=0.6, negative_prompt=""):
+def _quantize_unet(pipeline):
+    """Quantizes UNet weights to INT8 with optimum-quanto. Returns False if not installed."""
+
+    try:
+        from optimum.quanto import quantize, qint8, freeze
+    except ImportError:
+        print("   ⚠️ SDXL_INT8=1 but optimum-quanto is not installed, using FP16")
+        return False
+
+    quantize(pipeline.unet, weights=qint8)
+    freeze(pipeline.unet)
+    print("   ✅ UNet weights quantized to INT8")
+    return True
+
+
+def _max_batch_size(num_outputs):
+    """How many images fit in one pipeline call, based on currently free VRAM."""
+
+    if get_device() != "cuda":
+        return num_outputs
+
+    free_bytes, _ = torch.cuda.mem_get_info()
+    fits = int(free_bytes / (VRAM_PER_IMAGE_GB * 1024 ** 3))
+    return max(1, min(num_outputs, fits))
+
+
+def _enable_fast_attention(pipeline):
+    """Sets xFormers attention, or PyTorch SDPA when xformers is unavailable."""
+
+    try:
+        pipeline.enable_xformers_memory_efficient_attention()
+        print("   ✅ xFormers attention enabled")
+    except Exception:  # xformers not installed / unsupported
+        from diffusers.models.attention_processor import AttnProcessor2_0
+        pipeline.unet.set_attn_processor(AttnProcessor2_0())  # PyTorch SDPA
+        print("   ✅ SDPA attention enabled")
+
+
+def _torch_version():
+    """Returns the (major, minor) PyTorch version."""
+
+    major, minor = torch.__version__.split(".")[:2]
+    return int(major), int(minor)
+
+
+def _compile_unet(pipeline):
+    """
+    Wraps the UNet in torch.compile and warms it up at load time,
+    so the one-off compile cost is not paid by the first user request.
+    Falls back to eager mode if compilation is not supported (e.g. no Triton).
+    Returns True if the compiled UNet is in use.
+    """
+
+    eager_unet = pipeline.unet
+    print("   ⏳ Compiling UNet (one-off, ~30-60 seconds)...")
+
+    try:
+        pipeline.unet = torch.compile(eager_unet, mode="reduce-overhead", fullgraph=False)
+
+        _warmup(pipeline)  # compilation happens here
+
+        print("   ✅ UNet compiled")
+        return True
+    except Exception as e:
+        pipeline.unet = eager_unet
+        print(f"   ⚠️ torch.compile unavailable, using eager mode: {str(e)[:100]}")
+        return False
+
+
+def _warmup(pipeline):
+    """
+    Short pass that compiles / autotunes kernels for the shape the app sends:
+    uploads are fitted into DEFAULT_OUTPUT_SIZE and never upscaled here, so a
+    square upload arrives at exactly that size. Other aspect ratios still pay
+    for their own shape on first use.
+    """
+
+    with torch.inference_mode():
+        pipeline(
+            prompt="warmup",
+            image=Image.new("RGB", DEFAULT_OUTPUT_SIZE),
+            strength=0.5,
+            num_inference_steps=4
+        )
+
+
+def _load_init_image(image_bytes, max_size=1024):
+    """
+    Decodes the init image and shrinks it so the longest side is <= max_size.
+
+    On CUDA, JPEG uploads are decoded by nvJPEG and resized with antialiased
+    bicubic interpolation on the GPU, returned as a (1, 3, H, W) tensor in
+    [0, 1] that the pipeline accepts directly. Other formats (and CPU) use PIL.
+    """
+
+    if get_device() == "cuda" and get_image_mime(image_bytes)[0] == "image/jpeg":
+        try:
+            from torchvision.io import decode_jpeg, ImageReadMode  # optional - only needed here
+
+            data = torch.frombuffer(bytearray(image_bytes), dtype=torch.uint8)
+            tensor = decode_jpeg(data, mode=ImageReadMode.RGB, device="cuda")  # (3, H, W) uint8
+            height, width = tensor.shape[1:]
+            print(f"   📐 Original size: {(width, height)} (GPU decode)")
+
+            tensor = tensor.unsqueeze(0).float() / 255
+            if max(width, height) > max_size:
+                ratio = max_size / max(width, height)
+                new_size = (int(height * ratio), int(width * ratio))
+                tensor = F.interpolate(tensor, size=new_size, mode="bicubic", antialias=True).clamp_(0, 1)
+                print(f"   📐 Resize: {new_size[::-1]}")
+
+            return tensor
+        except ImportError:  # torchvision not installed
+            pass
+        except RuntimeError as e:  # e.g. progressive JPEG not supported by nvJPEG
+            print(f"   ⚠️ GPU decode failed, using PIL: {str(e)[:80]}")
+
+    init_image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+    print(f"   📐 Original size: {init_image.size}")
+
+    if max(init_image.size) > max_size:
+        ratio = max_size / max(init_image.size)
+        new_size = (int(init_image.width * ratio), int(init_image.height * ratio))
+        init_image = init_image.resize(new_size, Image.Resampling.LANCZOS)
+        print(f"   📐 Resize: {new_size}")
+
+    return init_image
+
+
+def transform_images(image_bytes, prompt="", strength=0.6, negative_prompt="", num_outputs=1, seed=None,
+                     num_inference_steps=DEFAULT_STEPS):
     """
     Transforms image using Local GPU.
 
@@ -116,9 +294,12 @@ def transform_image(image_bytes, prompt="", strength=0.6, negative_prompt=""):
             - 0.0 = original image
             - 1.0 = completely new image
         negative_prompt: Unwanted features
+        num_outputs: How many images to generate in one batch
+        seed: Random seed; batch images use seed, seed + 1, ... (None = random)
+        num_inference_steps: Denoising steps (DPM-Solver++, 15 is usually enough)
 
     Returns:
-        tuple: (success status, result image or error message)
+        tuple: (success status, list of result images or error message)
     """
 
     print("\n" + "🔥" * 40)
@@ -133,19 +314,9 @@ def transform_image(image_bytes, prompt="", strength=0.6, negative_prompt=""):
         print("📦 1. Loading pipeline...")
         pipeline = load_pipeline()
 
-        # 2. Convert image to PIL Image
+        # 2-3. Decode and shrink large images (VRAM saving, SDXL 1024x1024 ideal)
         print(f"🖼️  2. Processing image...")
-        init_image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-        print(f"   📐 Original size: {init_image.size}")
-
-        # 3. Size check for SDXL (1024x1024 ideal)
-        # Shrink large images (VRAM saving)
-        max_size = 1024
-        if max(init_image.size) > max_size:
-            ratio = max_size / max(init_image.size)
-            new_size = (int(init_image.width * ratio), int(init_image.height * ratio))
-            init_image = init_image.resize(new_size, Image.Resampling.LANCZOS)
-            print(f"   📐 Resize: {new_size}")
+        init_image = _load_init_image(image_bytes, max_size=1024)
 
         # 4. Prompt preparation
         if not prompt:
@@ -155,35 +326,70 @@ def transform_image(image_bytes, prompt="", strength=0.6, negative_prompt=""):
         print(f"   Prompt: {prompt[:80]}...")
         print(f"   Negative: {negative_prompt[:80] if negative_prompt else 'None'}...")
         print(f"   Strength: {strength}")
-        print(f"   Inference steps: 30")
+        print(f"   Inference steps: {num_inference_steps}")
         print(f"   Guidance scale: 7.5")
 
         # 5. Inference
         print("🚀 4. Starting GPU inference...")
         print("   ⏳ This process may take 10-30 seconds...")
 
-        with torch.inference_mode():  # Memory optimization
-            result = pipeline(
-                prompt=prompt,
-                image=init_image,
-                strength=strength,  # 0.0-1.0
-                negative_prompt=negative_prompt if negative_prompt else None,
-                num_inference_steps=30,  # Quality (between 30-50)
-                guidance_scale=7.5,  # Prompt adherence
-                num_images_per_prompt=1
-            )
+        # Fixed seed per image (seed, seed + 1, ...) for reproducible variations
+        generator = None
+        if seed is not None:
+            generator = [
+                torch.Generator(device=get_device()).manual_seed(seed + i)
+                for i in range(num_outputs)
+            ]
+
+        def run_pipeline(count, generators):
+            with torch.inference_mode():  # Memory optimization
+                return pipeline(
+                    prompt=prompt,
+                    image=init_image,
+                    strength=strength,  # 0.0-1.0
+                    negative_prompt=negative_prompt if negative_prompt else None,
+                    num_inference_steps=num_inference_steps,  # Quality (DPM-Solver++: 15-25)
+                    guidance_scale=7.5,  # Prompt adherence
+                    num_images_per_prompt=count,  # one batched UNet pass for the whole chunk
+                    generator=generators
+                ).images
+
+        # Split the batch if free VRAM can't hold all variations at once
+        batch_size = _max_batch_size(num_outputs)
+        if batch_size < num_outputs:
+            print(f"   ⚠️ Limited VRAM - generating in batches of {batch_size}")
+
+        output_images = []
+        for start in range(0, num_outputs, batch_size):
+            count = min(batch_size, num_outputs - start)
+            generators = generator[start:start + count] if generator else None
+
+            try:
+                output_images.extend(run_pipeline(count, generators))
+            except RuntimeError as e:
+                if "out of memory" not in str(e).lower():
+                    raise
+
+                # Fall back to attention slicing (slower, but much smaller peak VRAM) and retry once
+                print("   ⚠️ Out of memory - enabling attention slicing and retrying...")
+                torch.cuda.empty_cache()
+                pipeline.enable_attention_slicing(slice_size=1)
+                try:
+                    output_images.extend(run_pipeline(count, generators))
+                finally:
+                    # Only this batch pays for slicing - later calls get the fused kernels back
+                    pipeline.disable_attention_slicing()
+                    _enable_fast_attention(pipeline)
 
         # 6. Result
-        output_image = result.images[0]
-
-        print(f"   📐 Result: {output_image.size}")
+        print(f"   📐 Result: {len(output_images)} x {output_images[0].size}")
         print("\n✨✨✨ SUCCESS! Image transformed with Local GPU! ✨✨✨\n")
 
         # Clear VRAM
         if torch.cuda.is_available():
             torch.cuda.empty_cache()
 
-        return True, output_image
+        return True, output_images
 
     except RuntimeError as e:
         error_msg = str(e)
@@ -201,6 +407,31 @@ def transform_image(image_bytes, prompt="", strength=0.6, negative_prompt=""):
         return False, f"Local inference error: {error_msg[:150]}"
 
 
+def transform_image(image_bytes, prompt="", strength=0.6, negative_prompt="", seed=None,
+                    num_inference_steps=DEFAULT_STEPS):
+    """
+    Transforms image using Local GPU (single result).
+
+    Returns:
+        tuple: (success status, result image or error message)
+    """
+
+    success, result = transform_images(
+        image_bytes=image_bytes,
+        prompt=prompt,
+        strength=strength,
+        negative_prompt=negative_prompt,
+        num_outputs=1,
+        seed=seed,
+        num_inference_steps=num_inference_steps
+    )
+
+    if not success:
+        return False, result
+
+    return True, result[0]
+
+
 def transform_with_style(image_bytes, style_config):
     """Transforms using a preset style template."""
 
@@ -217,12 +448,40 @@ def transform_with_style(image_bytes, style_config):
 
 
 def unload_pipeline():
-    """Removes pipeline from memory (VRAM cleanup)."""
-    global _pipeline
+    """
+    Frees VRAM but keeps the weights in pinned RAM, so the next request
+    only needs a fast host-to-GPU copy instead of a full reload from disk.
+    """
+    global _offloaded
+
+    if _pipeline is None or _offloaded or get_device() != "cuda":
+        return
+
+    _pipeline.to("cpu")
+    _pin_host_memory(_pipeline)
+    _offloaded = True
+
+    torch.cuda.empty_cache()
+    print("💤 Pipeline moved to RAM (VRAM freed).")
+
+
+def _pin_host_memory(pipeline):
+    """Page-locks CPU weights so copying them back to the GPU is a fast async DMA."""
+
+    for component in pipeline.components.values():
+        if isinstance(component, torch.nn.Module):
+            for param in component.parameters():
+                param.data = param.data.pin_memory()
+
+
+def hard_unload_pipeline():
+    """Removes pipeline from memory completely (RAM and VRAM cleanup)."""
+    global _pipeline, _offloaded
 
     if _pipeline is not None:
         del _pipeline
         _pipeline = None
+        _offloaded = False
 
         if torch.cuda.is_available():
             torch.cuda.empty_cache()
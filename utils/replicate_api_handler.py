@@ -8,17 +8,24 @@ Model: timbrooks/instruct-pix2pix (Image editing with instructions)
 
 import replicate
 from PIL import Image
-import io
 import os
 from dotenv import load_dotenv
+from utils.http_client import create_session, download_image
+from utils.image_loader import get_image_mime, get_base64
 
 load_dotenv()  # load variables from .env file
 
 # Get Replicate API Token from .env file
 REPLICATE_API_TOKEN = os.getenv("REPLICATE_API_TOKEN")
 
+# Shared session for output downloads - keeps connections alive across calls
+_SESSION = create_session()
 
-def transform_image(image_bytes, prompt="", strength=0.6, negative_prompt=""):
+# Multiple images can be generated in one prediction (see transform_images)
+SUPPORTS_BATCH = True
+
+
+def transform_images(image_bytes, prompt="", strength=0.6, negative_prompt="", num_outputs=1, seed=None):
     """
     Transforms image using Replicate API.
 
@@ -32,9 +39,11 @@ def transform_image(image_bytes, prompt="", strength=0.6, negative_prompt=""):
         prompt: Transformation instruction (e.g., "turn into oil painting")
         strength: Transformation strength (0.0-1.0) - guidance scale for instruct-pix2pix
         negative_prompt: Unwanted features (not used, kept for compatibility)
+        num_outputs: How many images to generate in one prediction
+        seed: Random seed for reproducible results (None = random)
 
     Returns:
-        tuple: (success status, result image or error message)
+        tuple: (success status, list of result images or error message)
     """
 
     print("\n" + "🎨" * 35)
@@ -56,9 +65,9 @@ def transform_image(image_bytes, prompt="", strength=0.6, negative_prompt=""):
 
         # 2. Convert image to base64 string (Replicate accepts this)
         print("🖼️  2. Preparing image...")
-        import base64
-        image_base64 = base64.b64encode(image_bytes).decode('utf-8')
-        image_data_uri = f"data:image/png;base64,{image_base64}"
+        image_base64 = get_base64(image_bytes).decode('ascii')  # encoded once per upload
+        mime_type, _ = get_image_mime(image_bytes)
+        image_data_uri = f"data:{mime_type};base64,{image_base64}"
         print(f"   ✅ Base64 encoded: {len(image_base64)} characters")
 
         # 3. Model parameters
@@ -70,9 +79,13 @@ def transform_image(image_bytes, prompt="", strength=0.6, negative_prompt=""):
             "prompt": prompt if prompt else "improve the image quality",
             "num_inference_steps": 20,  # for better quality results
             "image_guidance_scale": 1.5,  # how faithful to original
-            "guidance_scale": 7.5  # how much to follow prompt (similar to strength)
+            "guidance_scale": 7.5,  # how much to follow prompt (similar to strength)
+            "num_outputs": num_outputs  # images per prediction
         }
 
+        if seed is not None:
+            input_params["seed"] = seed
+
         print(f"   Model: timbrooks/instruct-pix2pix")
         print(f"   Prompt: {input_params['prompt'][:50]}...")
         print(f"   Inference steps: {input_params['num_inference_steps']}")
@@ -93,32 +106,30 @@ def transform_image(image_bytes, prompt="", strength=0.6, negative_prompt=""):
         # 5. Process result
         print("🔄 5. Processing result...")
 
-        # Replicate output is usually URL or PIL Image
-        if isinstance(output, str):
-            # If URL, download it
-            print(f"   📥 Downloading image from URL: {output[:50]}...")
-            import requests
-            response = requests.get(output)
-            result_image = Image.open(io.BytesIO(response.content))
-        elif isinstance(output, Image.Image):
-            # Direct PIL Image
-            result_image = output
-        elif isinstance(output, list) and len(output) > 0:
-            # If list, get first element
-            if isinstance(output[0], str):
-                print(f"   📥 Downloading image from URL...")
-                import requests
-                response = requests.get(output[0])
-                result_image = Image.open(io.BytesIO(response.content))
-            else:
-                result_image = output[0]
-        else:
+        # Replicate output is usually URL, PIL Image or a list of them
+        outputs = output if isinstance(output, list) else [output]
+        if not outputs:
             return False, f"Unexpected output format: {type(output)}"
 
-        print(f"   📐 Result: {result_image.size}, {result_image.mode}")
+        result_images = []
+
+        for item in outputs:
+            if isinstance(item, str):
+                # If URL, download it
+                print(f"   📥 Downloading image from URL: {item[:50]}...")
+                result_image = download_image(_SESSION, item)  # streamed, no content copy
+            elif isinstance(item, Image.Image):
+                # Direct PIL Image
+                result_image = item
+            else:
+                return False, f"Unexpected output format: {type(item)}"
+
+            result_images.append(result_image)
+            print(f"   📐 Result: {result_image.size}, {result_image.mode}")
+
         print("\n✨✨✨ SUCCESS! Image transformed with Replicate! ✨✨✨\n")
 
-        return True, result_image
+        return True, result_images
 
     except Exception as e:
         error_msg = str(e)
@@ -138,6 +149,29 @@ def transform_image(image_bytes, prompt="", strength=0.6, negative_prompt=""):
             return False, f"Replicate API error: {error_msg[:150]}"
 
 
+def transform_image(image_bytes, prompt="", strength=0.6, negative_prompt="", seed=None):
+    """
+    Transforms image using Replicate API (single result).
+
+    Returns:
+        tuple: (success status, result image or error message)
+    """
+
+    success, result = transform_images(
+        image_bytes=image_bytes,
+        prompt=prompt,
+        strength=strength,
+        negative_prompt=negative_prompt,
+        num_outputs=1,
+        seed=seed
+    )
+
+    if not success:
+        return False, result
+
+    return True, result[0]
+
+
 def transform_with_style(image_bytes, style_config):
     """Transforms using a preset style template."""
 
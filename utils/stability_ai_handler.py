@@ -11,16 +11,79 @@ import requests
 from PIL import Image
 import io
 import os
-import base64
+import json
+import struct  # PNG header parsing
+import logging
+import time
+import threading  # per-thread encode buffer
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor  # for parallel style requests
 from dotenv import load_dotenv
+from urllib3.exceptions import InvalidHeader
+from urllib3.util.retry import Retry
+from utils.http_client import create_session, RATE_LIMIT_RETRY
+from utils.image_loader import get_image_mime
+
+try:
+    from pybase64 import b64decode  # optional - SIMD (AVX2/SSSE3) base64 decoder
+except ImportError:
+    from base64 import b64decode
+
+try:
+    import httpx  # optional - HTTP/2 client for the API calls
+except ImportError:
+    httpx = None
 
 load_dotenv()  # load variables from .env file
 
+logger = logging.getLogger(__name__)
+
 # Get Stability AI API Key from .env file
 STABILITY_API_KEY = os.getenv("STABILITY_API_KEY")
+_API_KEY_OK = bool(STABILITY_API_KEY)  # checked once - .env is only read at import
 
-# Stability AI API endpoint
+# Stability AI API endpoint (SDXL engine)
 API_HOST = "https://api.stability.ai"
+_ENGINE_ID = "stable-diffusion-xl-1024-v1-0"
+_URL = f"{API_HOST}/v1/generation/{_ENGINE_ID}/image-to-image"
+
+# Form fields that are the same for every request
+_STATIC_FORM_FIELDS = {
+    "cfg_scale": 12.0,  # Prompt adherence (7.5 → 12.0 quality increase)
+    "steps": 50,  # Inference steps (30 → 50 high quality)
+}
+
+# Shared session - keeps connections alive across calls, sends auth on every request,
+# retries 429/5xx with backoff instead of failing the variation
+_HEADERS = {"Accept": "application/json"}
+if _API_KEY_OK:
+    _HEADERS["Authorization"] = f"Bearer {STABILITY_API_KEY}"
+
+_SESSION = create_session(pool_connections=4, pool_maxsize=16, max_retries=RATE_LIMIT_RETRY)
+_SESSION.headers.update(_HEADERS)
+
+# HTTP/2 client: parallel generations share one multiplexed connection.
+# Needs httpx[http2]; without it every call goes through _SESSION.
+_HTTP2_CLIENT = None
+if httpx is not None:
+    try:
+        _HTTP2_CLIENT = httpx.Client(
+            http2=True,
+            headers=_HEADERS,
+            timeout=120,  # generation takes 10-30+ seconds
+            limits=httpx.Limits(max_keepalive_connections=4)
+        )
+    except ImportError:  # h2 package missing
+        pass
+
+_REQUEST_ERRORS = (requests.exceptions.RequestException,) + ((httpx.HTTPError,) if httpx else ())
+
+# Multiple images can be generated in one request (see transform_images)
+SUPPORTS_BATCH = True
+
+# Upper bound on concurrent style requests (stays under the default rate limit)
+MAX_PARALLEL_STYLES = 4
 
 # SDXL allowed dimensions (width x height)
 SDXL_ALLOWED_DIMENSIONS = [
@@ -34,6 +97,125 @@ SDXL_ALLOWED_DIMENSIONS = [
     (832, 1216),
     (896, 1152),
 ]
+_SDXL_DIMS_SET = frozenset(SDXL_ALLOWED_DIMENSIONS)
+
+# Reusable PNG encode buffer, one per worker thread
+_TLS = threading.local()
+
+
+def _encode_buffer():
+    """Returns this thread's encode buffer, emptied for reuse."""
+
+    buf = getattr(_TLS, "buf", None)
+    if buf is None:
+        buf = _TLS.buf = io.BytesIO()
+
+    buf.seek(0)
+    buf.truncate()
+    return buf
+
+
+def _api_post(headers, files, data, stream=False):
+    """POST to the image-to-image endpoint (HTTP/2 when available)."""
+
+    if _HTTP2_CLIENT is None:
+        return _SESSION.post(_URL, headers=headers, files=files, data=data, stream=stream)
+
+    # httpx does not retry on status codes - apply the session's rate-limit policy here
+    retry = RATE_LIMIT_RETRY
+    for attempt in range(retry.total + 1):
+        response = _HTTP2_CLIENT.post(_URL, headers=headers, files=files, data=data)
+        retry_after = response.headers.get("retry-after")
+        if attempt == retry.total or not retry.is_retry("POST", response.status_code, bool(retry_after)):
+            return response
+
+        delay = retry.backoff_factor * 2 ** attempt
+        if retry_after and retry.respect_retry_after_header:
+            try:
+                delay = retry.parse_retry_after(retry_after)  # seconds or HTTP date, capped by the policy
+            except InvalidHeader:
+                pass
+        time.sleep(min(delay, Retry.DEFAULT_BACKOFF_MAX))  # same backoff ceiling as urllib3
+
+
+def _get_result_bytes(response):
+    """
+    Extracts the encoded result images from a successful API response.
+
+    Returns:
+        tuple: (success status, list of PNG bytes or error message)
+    """
+
+    # Raw image response (single sample) - finish reason comes in a header
+    if response.headers.get("content-type", "").startswith("image/"):
+        if response.headers.get("finish-reason") == "CONTENT_FILTERED":
+            return False, "Caught by content filter. Please change your prompt."
+        return True, [response.content]
+
+    # JSON response (multiple samples) - base64 artifacts
+    response_data = json.loads(response.content)  # parse the bytes - no response.text decode pass
+
+    # Artifacts check
+    if "artifacts" not in response_data or len(response_data["artifacts"]) == 0:
+        return False, "No image returned from API."
+
+    result_bytes = []
+
+    for artifact in response_data["artifacts"]:
+        # Finish reason check
+        if artifact.get("finishReason") == "CONTENT_FILTERED":
+            return False, "Caught by content filter. Please change your prompt."
+
+        # Decode base64 image
+        image_base64 = artifact.get("base64")
+        if not image_base64:
+            return False, "Could not get base64 image from API."
+
+        logger.debug("   Base64 data: %d characters", len(image_base64))
+        result_bytes.append(b64decode(image_base64.encode("ascii"), validate=False))  # bytes in, no implicit transcode
+
+    return True, result_bytes
+
+
+def _read_image(response):
+    """Decodes a raw image response body (streamed straight into PIL for requests)."""
+
+    if not isinstance(response, requests.Response):  # httpx - body is already in memory
+        return Image.open(io.BytesIO(response.content))
+
+    response.raw.decode_content = True  # handle gzip/deflate transfer encoding
+    with response:  # release the connection once the body is consumed
+        image = Image.open(response.raw)
+        image.load()  # read everything before the connection is released
+    return image
+
+
+def _get_result_images(response):
+    """
+    Like _get_result_bytes, but returns decoded PIL images.
+
+    Returns:
+        tuple: (success status, list of result images or error message)
+    """
+
+    # Raw image response (single sample) - decoded from the stream, no buffered copy
+    if (response.headers.get("content-type", "").startswith("image/")
+            and response.headers.get("finish-reason") != "CONTENT_FILTERED"):
+        return True, [_read_image(response)]
+
+    success, result = _get_result_bytes(response)
+    if not success:
+        return False, result
+
+    return True, [Image.open(io.BytesIO(data)) for data in result]
+
+
+def _peek_png_size(image_bytes):
+    """Reads (width, height) from a PNG's IHDR chunk without decoding, None if not a PNG."""
+
+    if image_bytes[:8] != b"\x89PNG\r\n\x1a\n" or len(image_bytes) < 24:
+        return None
+    return struct.unpack(">II", image_bytes[16:24])
 
 
 def resize_for_sdxl(image):
@@ -42,28 +224,23 @@ def resize_for_sdxl(image):
     Preserves aspect ratio as much as possible.
     """
     original_width, original_height = image.size
-    original_aspect = original_width / original_height
 
-    # Find the closest compatible dimension
-    best_match = None
-    best_aspect_diff = float('inf')
+    if image.size in _SDXL_DIMS_SET:  # already an allowed size
+        return image
 
-    for width, height in SDXL_ALLOWED_DIMENSIONS:
-        target_aspect = width / height
-        aspect_diff = abs(target_aspect - original_aspect)
+    original_aspect = original_width / original_height
 
-        if aspect_diff < best_aspect_diff:
-            best_aspect_diff = aspect_diff
-            best_match = (width, height)
+    # Find the closest compatible dimension (first one wins on ties)
+    best_match = min(SDXL_ALLOWED_DIMENSIONS, key=lambda dims: abs(dims[0] / dims[1] - original_aspect))
 
     # Resize
-    resized = image.resize(best_match, Image.Resampling.LANCZOS)
-    print(f"   📐 Resize: {original_width}x{original_height} → {best_match[0]}x{best_match[1]}")
+    resized = image.resize(best_match, Image.Resampling.LANCZOS, reducing_gap=3.0)  # box-reduce prepass on big downscales
+    logger.debug("   📐 Resize: %dx%d → %dx%d", original_width, original_height, best_match[0], best_match[1])
 
     return resized
 
 
-def transform_image(image_bytes, prompt="", strength=0.6, negative_prompt=""):
+def _transform(image_bytes, prompt, strength, negative_prompt, num_outputs, seed, decode):
     """
     Transforms image using Stability AI REST API.
 
@@ -77,49 +254,73 @@ def transform_image(image_bytes, prompt="", strength=0.6, negative_prompt=""):
         prompt: Transformation instruction
         strength: Image strength (0.0-1.0) - lower = more similar to original
         negative_prompt: Unwanted features
+        num_outputs: How many images to generate in one request (samples)
+        seed: Random seed for reproducible results (None = random)
+        decode: True for PIL images (raw PNG streamed into PIL), False for PNG bytes
 
     Returns:
-        tuple: (success status, result image or error message)
+        tuple: (success status, list of result images / PNG bytes or error message)
     """
 
-    print("\n" + "⚡" * 35)
-    print("=== STABILITY AI REST API ===")
-    print(f"Prompt: {prompt[:60] if prompt else 'Not specified'}...")
-    print(f"Image Strength: {strength}")
-    print(f"Image size: {len(image_bytes)} bytes")
-    print("⚡" * 35 + "\n")
+    if logger.isEnabledFor(logging.DEBUG):  # skip the formatting entirely when not logging
+        logger.debug("=== STABILITY AI REST API ===")
+        logger.debug("Prompt: %s...", prompt[:60] if prompt else "Not specified")
+        logger.debug("Image Strength: %s", strength)
+        logger.debug("Image size: %d bytes", len(image_bytes))
 
     # API Key check
-    if not STABILITY_API_KEY:
+    if not _API_KEY_OK:
         return False, "Stability AI API key not found. Add STABILITY_API_KEY to .env file."
 
-    print(f"✅ API Key: {STABILITY_API_KEY[:10]}...{STABILITY_API_KEY[-5:]}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("✅ API Key: %s...%s", STABILITY_API_KEY[:10], STABILITY_API_KEY[-5:])
+
+    upload_view = None  # set when the upload is encoded into the thread's buffer
 
     try:
         # 1. Convert image to PIL Image and resize to SDXL dimensions
-        print(f"🖼️  1. Converting image to SDXL format...")
-        image = Image.open(io.BytesIO(image_bytes))
-        image = resize_for_sdxl(image)  # Resize to SDXL compatible dimensions
+        logger.debug("🖼️  1. Converting image to SDXL format...")
+        mime_type, extension = get_image_mime(image_bytes)
+
+        # PNG: the size is in the IHDR chunk, no need to involve PIL at all
+        size = _peek_png_size(image_bytes) if mime_type == "image/png" else None
+        image = None
+        if size is None:
+            image = Image.open(io.BytesIO(image_bytes))  # lazy - only the header is read here
+            size = image.size
+
+        if size in _SDXL_DIMS_SET and mime_type in ("image/png", "image/jpeg"):
+            # Already a valid SDXL size in an accepted format - upload as is.
+            # Only direct API callers get here: app uploads are fitted into
+            # DEFAULT_OUTPUT_SIZE (512px) and every SDXL size is >= 640px per side.
+            logger.debug("   📐 Size %dx%d already SDXL compatible, no resize", *size)
+        else:
+            if image is None:
+                image = Image.open(io.BytesIO(image_bytes))
+
+            if image.mode != "RGB":  # drop alpha/palette once - resize and encode then work on 3 channels
+                image = image.convert("RGB")
 
-        # Convert resized image to bytes
-        byte_stream = io.BytesIO()
-        image.save(byte_stream, format="PNG")
-        byte_stream.seek(0)
-        image_bytes = byte_stream.getvalue()
+            image = resize_for_sdxl(image)  # Resize to SDXL compatible dimensions
 
-        # 2. Engine selection (preferring SDXL)
-        engine_id = "stable-diffusion-xl-1024-v1-0"
-        print(f"🔧 2. Engine: {engine_id}")
+            # Convert resized image to bytes in the reused per-thread buffer - no getvalue copy
+            byte_stream = _encode_buffer()
+            image.save(byte_stream, format="PNG", compress_level=1)  # fast DEFLATE, only sent once
+            if _HTTP2_CLIENT is None:
+                upload_view = image_bytes = byte_stream.getbuffer()  # requests copies it into the body once
+            else:
+                byte_stream.seek(0)
+                image_bytes = byte_stream  # httpx streams file objects - no copy at all
+            mime_type, extension = "image/png", "png"
 
-        # 3. API endpoint
-        url = f"{API_HOST}/v1/generation/{engine_id}/image-to-image"
-        print(f"🌐 3. Endpoint: {url}")
+        # 2-3. Engine (SDXL) and endpoint are fixed at import
+        logger.debug("🔧 2. Engine: %s", _ENGINE_ID)
+        logger.debug("🌐 3. Endpoint: %s", _URL)
 
         # 4. Headers preparation
-        headers = {
-            "Accept": "application/json",
-            "Authorization": f"Bearer {STABILITY_API_KEY}"
-        }
+        # A single sample can come back as raw PNG (no base64 +33%, no JSON parse)
+        # (Authorization and the default JSON Accept live on the session)
+        headers = {"Accept": "image/png"} if num_outputs == 1 else None
 
         # 5. Text prompts preparation
         text_prompts = []
@@ -143,15 +344,15 @@ def transform_image(image_bytes, prompt="", strength=0.6, negative_prompt=""):
                 "weight": -1.0
             })
 
-        print(f"📝 4. Text prompts prepared:")
-        print(f"   Positive: {text_prompts[0]['text'][:50]}...")
+        logger.debug("📝 4. Text prompts prepared:")
+        logger.debug("   Positive: %.50s...", text_prompts[0]["text"])
         if len(text_prompts) > 1:
-            print(f"   Negative: {text_prompts[1]['text'][:50]}...")
+            logger.debug("   Negative: %.50s...", text_prompts[1]["text"])
 
         # 6. Form data preparation
         # Stability AI expects multipart/form-data
         files = {
-            "init_image": ("image.png", image_bytes, "image/png")
+            "init_image": (f"image.{extension}", image_bytes, mime_type)
         }
 
         # Image strength: 0 = fully original, 1 = completely new
@@ -163,34 +364,30 @@ def transform_image(image_bytes, prompt="", strength=0.6, negative_prompt=""):
             "text_prompts[0][text]": text_prompts[0]["text"],
             "text_prompts[0][weight]": text_prompts[0]["weight"],
             "image_strength": image_strength,  # 0.0-1.0
-            "cfg_scale": 12.0,  # Prompt adherence (7.5 → 12.0 quality increase)
-            "samples": 1,  # How many images to generate
-            "steps": 50,  # Inference steps (30 → 50 high quality)
+            "samples": num_outputs,  # How many images to generate
+            **_STATIC_FORM_FIELDS
         }
 
+        if seed is not None:
+            data["seed"] = seed
+
         # Add negative prompt if exists
         if len(text_prompts) > 1:
             data["text_prompts[1][text]"] = text_prompts[1]["text"]
             data["text_prompts[1][weight]"] = text_prompts[1]["weight"]
 
-        print(f"⚙️  5. Parameters:")
-        print(f"   Image strength: {image_strength:.2f}")
-        print(f"   CFG scale: {data['cfg_scale']}")
-        print(f"   Steps: {data['steps']}")
+        logger.debug("⚙️  5. Parameters:")
+        logger.debug("   Image strength: %.2f", image_strength)
+        logger.debug("   CFG scale: %s", data["cfg_scale"])
+        logger.debug("   Steps: %s", data["steps"])
 
         # 6. API call
-        print("🚀 6. Making API call...")
-        print("   ⏳ Generating image (may take 10-30 seconds)...")
-
-        response = requests.post(
-            url,
-            headers=headers,
-            files=files,
-            data=data
-        )
+        logger.debug("🚀 6. Making API call (may take 10-30 seconds)...")
+
+        response = _api_post(headers, files, data, stream=decode)  # decode reads the body on demand
 
         # 7. Response check
-        print(f"📥 7. Response received: HTTP {response.status_code}")
+        logger.debug("📥 7. Response received: HTTP %d", response.status_code)
 
         if response.status_code != 200:
             error_data = response.json() if response.headers.get('content-type') == 'application/json' else {}
@@ -204,54 +401,120 @@ def transform_image(image_bytes, prompt="", strength=0.6, negative_prompt=""):
             elif response.status_code == 403:
                 return False, "You don't have permission for this operation. Check your subscription plan."
             elif response.status_code == 404:
-                return False, f"Engine not found: {engine_id}"
-            elif response.status_code == 429:
-                return False, "Rate limit exceeded. Wait a few seconds and try again."
+                return False, f"Engine not found: {_ENGINE_ID}"
             else:
                 return False, f"Stability AI API error: {error_message}"
 
         # 8. Process result
-        print("🔄 8. Processing result...")
-        response_data = response.json()
-
-        # Artifacts check
-        if "artifacts" not in response_data or len(response_data["artifacts"]) == 0:
-            return False, "No image returned from API."
+        logger.debug("🔄 8. Processing result...")
 
-        # Get first artifact
-        artifact = response_data["artifacts"][0]
+        success, result = _get_result_images(response) if decode else _get_result_bytes(response)
+        if not success:
+            return False, result
 
-        # Finish reason check
-        if artifact.get("finishReason") == "CONTENT_FILTERED":
-            return False, "Caught by content filter. Please change your prompt."
+        logger.info("✨ %d image(s) transformed with Stability AI", len(result))
 
-        # Decode base64 image
-        image_base64 = artifact.get("base64")
-        if not image_base64:
-            return False, "Could not get base64 image from API."
+        return True, result
 
-        print(f"   Base64 data: {len(image_base64)} characters")
-
-        # Convert base64 to PIL Image
-        image_data = base64.b64decode(image_base64)
-        result_image = Image.open(io.BytesIO(image_data))
-
-        print(f"   📐 Result: {result_image.size}, {result_image.mode}")
-        print("\n✨✨✨ SUCCESS! Image transformed with Stability AI! ✨✨✨\n")
-
-        return True, result_image
-
-    except requests.exceptions.RequestException as e:
+    except _REQUEST_ERRORS as e:
         error_msg = str(e)
-        print(f"   ❌ Request Error: {error_msg[:150]}")
+        logger.error("❌ Request Error: %.150s", error_msg)
         return False, f"Stability AI connection error: {error_msg[:150]}"
 
     except Exception as e:
         error_msg = str(e)
-        print(f"   ❌ Error: {type(e).__name__}")
-        print(f"   📋 Message: {error_msg[:200]}")
+        logger.error("❌ Error: %s: %.200s", type(e).__name__, error_msg)
         return False, f"Stability AI API error: {error_msg[:150]}"
 
+    finally:
+        if upload_view is not None:
+            upload_view.release()  # unlock the thread's buffer for the next call
+
+
+def transform_images(image_bytes, prompt="", strength=0.6, negative_prompt="", num_outputs=1, seed=None):
+    """
+    Transforms image using Stability AI REST API.
+
+    Returns:
+        tuple: (success status, list of result images or error message)
+    """
+
+    return _transform(image_bytes, prompt, strength, negative_prompt, num_outputs, seed, decode=True)
+
+
+def transform_images_raw(image_bytes, prompt="", strength=0.6, negative_prompt="", num_outputs=1, seed=None):
+    """
+    Transforms image using Stability AI REST API, returning encoded results.
+    For callers that save or forward the PNGs - skips a decode/encode round-trip.
+
+    Returns:
+        tuple: (success status, list of result PNG bytes or error message)
+    """
+
+    return _transform(image_bytes, prompt, strength, negative_prompt, num_outputs, seed, decode=False)
+
+
+def transform_image_raw(image_bytes, prompt="", strength=0.6, negative_prompt="", seed=None):
+    """
+    Transforms image using Stability AI REST API (single result, not decoded).
+    For callers that save or forward the PNG - skips a decode/encode round-trip.
+
+    Returns:
+        tuple: (success status, result PNG bytes or error message)
+    """
+
+    success, result = transform_images_raw(
+        image_bytes=image_bytes,
+        prompt=prompt,
+        strength=strength,
+        negative_prompt=negative_prompt,
+        num_outputs=1,
+        seed=seed
+    )
+
+    if not success:
+        return False, result
+
+    return True, result[0]
+
+
+def transform_image(image_bytes, prompt="", strength=0.6, negative_prompt="", seed=None):
+    """
+    Transforms image using Stability AI REST API (single result).
+
+    Returns:
+        tuple: (success status, result image or error message)
+    """
+
+    success, result = transform_images(
+        image_bytes=image_bytes,
+        prompt=prompt,
+        strength=strength,
+        negative_prompt=negative_prompt,
+        num_outputs=1,
+        seed=seed
+    )
+
+    if not success:
+        return False, result
+
+    return True, result[0]
+
+
+async def transform_image_async(image_bytes, prompt="", strength=0.6, negative_prompt="", seed=None):
+    """
+    Awaitable version of transform_image for asyncio callers.
+
+    The request and the base64/PNG decode both run in the loop's default
+    thread pool, so the event loop stays free while generations are in flight.
+    """
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        None,
+        functools.partial(transform_image, image_bytes, prompt, strength, negative_prompt, seed)
+    )
+
 
 def transform_with_style(image_bytes, style_config):
     """Transforms using a preset style template."""
@@ -266,4 +529,18 @@ def transform_with_style(image_bytes, style_config):
         prompt=prompt,
         strength=strength,
         negative_prompt=negative_prompt
-    )
\ No newline at end of file
+    )
+
+
+def transform_with_styles_parallel(image_bytes, style_configs, max_workers=MAX_PARALLEL_STYLES):
+    """
+    Transforms with several preset styles concurrently (requests are network-bound).
+    Returns a list of (success, result) tuples in the same order as style_configs.
+    """
+
+    if not style_configs:
+        return []
+
+    workers = max(1, min(max_workers, MAX_PARALLEL_STYLES, len(style_configs)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:  # shares the pooled session
+        return list(pool.map(lambda config: transform_with_style(image_bytes, config), style_configs))